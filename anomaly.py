@@ -0,0 +1,144 @@
+"""
+用电异常检测模块
+
+低电量报警只看余额，发现不了"空调忘关"或电表故障这类消耗突然变快的情况。
+本模块为每个序列（"light" / "ac" / 房间号）按一天中的 24 个小时分别维护消耗速率基线，
+每次轮询用新读数增量更新，速率达到同时段基线的 ANOMALY_FACTOR 倍时报警。
+
+- 速率按相邻两次读数计算，归入区间中点所在的小时
+- 充值（余额上升）与间隔超过 LEDGER_GAP_HOURS 的区间不参与计算
+- 异常读数不计入基线，避免持续异常把基线拉高
+- 同一序列持续异常时只在开始时报警一次，恢复正常后重新计数
+
+baselines.json 格式:
+    {"series": {"ac": {"last": {"at": 1736000000, "balance": 30.2},
+                       "hours": [[样本数, 平均速率], ... 共 24 项],
+                       "alerting": false}}}
+
+每次轮询只读写一次基线文件，计算量与房间数成正比，整栋楼数百个房间也只需几毫秒。
+"""
+import logging
+from datetime import datetime
+from os import path
+from typing import Dict, List, Optional
+
+from config import (
+    ANOMALY_FACTOR, ANOMALY_MIN_RATE, ANOMALY_MIN_SAMPLES, ANOMALY_WINDOW, BASELINE_FILE,
+    LEDGER_GAP_HOURS,
+)
+from storage import load_json, locked, save_json
+from timeutil import get_timezone, parse_record_time
+
+logger = logging.getLogger(__name__)
+
+HOURS = 24
+
+# 基线平滑系数下限：样本较少时按算术平均学习，之后按窗口做指数平滑
+MIN_ALPHA = 2 / (ANOMALY_WINDOW + 1)
+
+
+def load_baselines() -> Dict:
+    """
+    读取基线
+
+    Returns:
+        {"series": {key: {"last", "hours", "alerting"}}}，不存在时返回空结构
+    """
+    baselines = load_json(BASELINE_FILE) if path.exists(BASELINE_FILE) else None
+    if not isinstance(baselines, dict):
+        baselines = {}
+    baselines.setdefault("series", {})
+    return baselines
+
+
+def _new_state() -> Dict:
+    return {"last": None, "hours": [[0, 0.0] for _ in range(HOURS)], "alerting": False}
+
+
+def check_reading(state: Dict, key: str, at: float, balance: float) -> Optional[Dict]:
+    """
+    用一个新读数更新序列状态，原地修改
+
+    Args:
+        state: 序列状态 {"last", "hours", "alerting"}
+        key: 序列键
+        at: 读数时间（Unix 时间戳）
+        balance: 余额
+
+    Returns:
+        新出现的异常 {"series", "rate", "baseline", "ratio", "hour"}，否则返回 None
+    """
+    last = state.get("last")
+    state["last"] = {"at": at, "balance": balance}
+    if not last:
+        return None
+
+    hours = (at - last["at"]) / 3600
+    delta = last["balance"] - balance
+    if hours <= 0 or hours > LEDGER_GAP_HOURS or delta < 0:
+        return None
+
+    rate = delta / hours
+    hour = datetime.fromtimestamp((at + last["at"]) / 2, get_timezone()).hour
+    bucket = state["hours"][hour]
+    samples, baseline = bucket
+
+    abnormal = (
+        samples >= ANOMALY_MIN_SAMPLES
+        and rate >= ANOMALY_MIN_RATE
+        and rate >= baseline * ANOMALY_FACTOR
+    )
+    if abnormal:
+        first = not state.get("alerting")
+        state["alerting"] = True
+        if not first:
+            return None
+        return {
+            "series": key,
+            "rate": round(rate, 2),
+            "baseline": round(baseline, 2),
+            "ratio": round(rate / baseline, 1) if baseline else None,  # 平时几乎不耗电
+            "hour": hour,
+        }
+
+    state["alerting"] = False
+    alpha = max(1 / (samples + 1), MIN_ALPHA)
+    bucket[0] = samples + 1
+    bucket[1] = round(baseline + alpha * (rate - baseline), 4)
+    return None
+
+
+@locked
+def detect_anomalies(time_str: str, readings: Dict[str, float]) -> List[Dict]:
+    """
+    用本次轮询的读数更新基线并检测异常
+
+    Args:
+        time_str: 记录时间（"MM-DD HH:MM:SS"）
+        readings: {序列键: 余额}
+
+    Returns:
+        新出现的异常列表
+    """
+    recorded_at = parse_record_time(time_str)
+    if recorded_at is None:
+        logger.warning(f"无法解析记录时间，跳过异常检测: {time_str}")
+        return []
+    at = recorded_at.timestamp()
+
+    baselines = load_baselines()
+    series = baselines["series"]
+    anomalies = []
+    for key, balance in readings.items():
+        anomaly = check_reading(series.setdefault(key, _new_state()), key, at, balance)
+        if anomaly:
+            anomalies.append(anomaly)
+
+    save_json(baselines, BASELINE_FILE)
+
+    for anomaly in anomalies:
+        logger.warning(
+            f"用电异常: {anomaly['series']} {anomaly['rate']} 度/小时 "
+            f"(同时段基线 {anomaly['baseline']})"
+        )
+    return anomalies
@@ -0,0 +1,184 @@
+"""
+余额缓存模块
+
+命令行查询、本地 HTTP 接口等只需要"当前余额"的场景，不必每次都完整登录 CAS 再查询一卡通。
+BalanceCache 以 latest.json（存储输出端写入的最新读数及其时间）为后端:
+
+- 读数在 BALANCE_CACHE_TTL 秒内: 直接返回，不产生任何网络请求
+- 超过 TTL 但未超过 TTL + BALANCE_STALE_TTL: 立即返回旧值（fresh=False），后台刷新
+- 更旧或缺失: 同步刷新后返回
+
+刷新只获取读数并写入 latest.json（由调用方提供，不发送通知），之后重新读取；
+同一时刻只有一个刷新在执行，并发请求会等待同一次刷新。
+单次运行的命令行在退出前需调用 wait_revalidation()，等待后台刷新写完。
+
+返回的每个余额都带有读数时间、距今秒数与是否新鲜，新鲜度对调用方始终可见。
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from config import BALANCE_CACHE_TTL, BALANCE_STALE_TTL, LATEST_FILE
+from storage import load_latest
+from timeutil import parse_record_time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedBalance:
+    """
+    带新鲜度的余额
+
+    Attributes:
+        key: 序列键（"light" / "ac" / 房间号）
+        balance: 剩余电量
+        recorded_at: 读数时间（Unix 时间戳）
+        age: 距今秒数
+        fresh: 是否在 TTL 内
+    """
+
+    key: str
+    balance: float
+    recorded_at: float
+    age: float
+    fresh: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BalanceCache:
+    """以 latest.json 为后端、支持过期后台刷新的余额缓存"""
+
+    def __init__(
+        self,
+        refresh: Callable[[], Any],
+        ttl: float = BALANCE_CACHE_TTL,
+        stale: float = BALANCE_STALE_TTL,
+        file_path: str = LATEST_FILE,
+    ):
+        """
+        Args:
+            refresh: 刷新函数，获取读数并写入 latest.json（不应发送通知）
+            ttl: 读数视为新鲜的秒数
+            stale: 过期后仍可先返回旧值、后台刷新的秒数
+            file_path: 最新读数文件
+        """
+        self.refresh = refresh
+        self.ttl = ttl
+        self.stale = stale
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._generation = 0  # 已完成的刷新次数
+        self._thread: Optional[threading.Thread] = None
+        self._mtime: Optional[int] = None
+        self._entries: Dict[str, Tuple[float, float]] = {}
+
+    def _snapshot(self) -> Dict[str, Tuple[float, float]]:
+        """读取最新读数 {key: (余额, 读数时间)}，文件未变化时复用上次结果"""
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            if mtime != self._mtime:
+                entries = {}
+                for key, entry in load_latest()["rooms"].items():
+                    recorded_at = parse_record_time(entry.get("time", ""))
+                    if recorded_at is not None and entry.get("balance") is not None:
+                        entries[key] = (entry["balance"], recorded_at.timestamp())
+                self._entries = entries
+                self._mtime = mtime
+            return dict(self._entries)
+
+    def refresh_now(self, refresh: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        同步刷新；已有刷新在执行时等待其完成
+
+        Args:
+            refresh: 本次使用的刷新函数（如常驻模式的完整轮询），总会执行；
+                为空时使用缓存自身的刷新函数，等待到他人的刷新后不再重复请求
+
+        Returns:
+            刷新函数的返回值，等待他人刷新时返回 None
+        """
+        generation = self._generation
+        with self._refresh_lock:
+            if refresh is None and self._generation != generation:
+                return None
+            try:
+                return (refresh or self.refresh)()
+            finally:
+                self._generation += 1
+
+    def _revalidate(self) -> None:
+        """后台刷新（已有刷新在执行时跳过）"""
+        if self._refresh_lock.locked():
+            return
+
+        def run():
+            try:
+                self.refresh_now()
+            except Exception as e:
+                logger.warning(f"后台刷新余额失败: {e}")
+
+        self._thread = threading.Thread(target=run, name="balance-revalidate", daemon=True)
+        self._thread.start()
+
+    def wait_revalidation(self, timeout: Optional[float] = None) -> None:
+        """等待后台刷新结束（进程即将退出时调用，避免写入被中断）"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _build(
+        self, entries: Dict[str, Tuple[float, float]], keys: Iterable[str]
+    ) -> Dict[str, CachedBalance]:
+        now = time.time()
+        result = {}
+        for key in keys:
+            if key in entries:
+                balance, recorded_at = entries[key]
+                age = max(0.0, now - recorded_at)
+                result[key] = CachedBalance(key, balance, recorded_at, round(age, 1), age <= self.ttl)
+        return result
+
+    def get(self, keys: Optional[Iterable[str]] = None) -> Dict[str, CachedBalance]:
+        """
+        获取余额
+
+        Args:
+            keys: 序列键，为空时返回全部已知序列
+
+        Returns:
+            {序列键: CachedBalance}，刷新失败且无缓存的序列不包含在结果中
+        """
+        entries = self._snapshot()
+        keys = list(keys) if keys is not None else list(entries)
+        now = time.time()
+        ages = [now - entries[key][1] if key in entries else float("inf") for key in keys]
+        oldest = max(ages, default=float("inf"))
+
+        if oldest <= self.ttl:
+            return self._build(entries, keys)
+
+        if oldest <= self.ttl + self.stale:
+            logger.info(f"余额缓存已过期 {oldest - self.ttl:.0f} 秒，先返回旧值并后台刷新")
+            self._revalidate()
+            return self._build(entries, keys)
+
+        logger.info("余额缓存缺失或过旧，同步刷新")
+        try:
+            self.refresh_now()
+        except Exception as e:
+            logger.error(f"刷新余额失败: {e}")
+        entries = self._snapshot()
+        if not keys:
+            keys = list(entries)
+        return self._build(entries, keys)
@@ -0,0 +1,130 @@
+"""
+通知分发离线基准测试
+
+启动 bench/mock_notify_sink.py 中的本地接收端，并将全部通知渠道指向它，测量:
+- 一次报警分发（send_alert，全部渠道）的总耗时
+- 各渠道单次发送耗时（p50 / max）与成功、失败次数
+- 注入失败时的服务端请求次数（含重试）
+
+在临时目录中运行，渠道令牌缓存（如企业微信 access_token）不会写入真实的 page/data/tokens.json。
+
+用法:
+    python bench/bench_notify.py --runs 20
+    python bench/bench_notify.py --latency 0.02 --failure-rate 0.2 --json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_benchmark(args) -> dict:
+    """执行基准测试，返回结果汇总"""
+    from mock_notify_sink import MockSink
+
+    sink = MockSink(latency=args.latency, failure_rate=args.failure_rate, seed=args.seed).start()
+    # config 在导入时读取环境变量，必须先指向本地接收端
+    os.environ.update(sink.env())
+
+    from tenacity import wait_none
+
+    import notify
+    from timing import report
+
+    # 去掉重试等待，只测量请求本身
+    for _, func in [("Telegram", notify.send_telegram)] + notify.ALERT_CHANNELS:
+        func.retry.wait = wait_none()
+    report.reset()
+
+    durations = []
+    try:
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            notify.send_alert("⚠️宿舍电量预警⚠️", "基准测试消息 1.23 度")
+            durations.append(time.perf_counter() - start)
+    finally:
+        sink.stop()
+
+    channels = defaultdict(lambda: {"ok": 0, "error": 0, "durations": []})
+    for entry in report.spans:
+        if entry["name"].startswith("notify.") and entry["status"] != "wait":
+            channel = channels[entry["name"][len("notify."):]]
+            channel[entry["status"]] += 1
+            channel["durations"].append(entry["duration"])
+    report.reset()
+
+    return {
+        "runs": args.runs,
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "alert_time_p50": round(statistics.median(durations), 4),
+        "alert_time_max": round(max(durations), 4),
+        "server_requests": sum(sink.requests.values()),
+        "server_failures": sum(sink.failures.values()),
+        "channels": {
+            name: {
+                "success": item["ok"],
+                "failure": item["error"],
+                "p50": round(statistics.median(item["durations"]), 4),
+                "max": round(max(item["durations"]), 4),
+            }
+            for name, item in sorted(channels.items())
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="通知分发离线基准测试")
+    parser.add_argument("--runs", type=int, default=10, help="报警分发次数")
+    parser.add_argument("--latency", type=float, default=0.0, help="接收端响应延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="接收端失败概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    # config 的 DATA_DIR 为相对路径，切换到临时目录后令牌缓存等文件都写入其中
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "page", "data"))
+        os.chdir(workdir)
+        try:
+            result = run_benchmark(args)
+        finally:
+            os.chdir(cwd)
+
+    # 未注入失败时任何失败都说明渠道实现有问题，不能作为正常基线
+    unexpected = [
+        name for name, item in result["channels"].items()
+        if item["failure"] and not args.failure_rate
+    ]
+    result["unexpected_failures"] = unexpected
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 1 if unexpected else 0
+
+    for key, value in result.items():
+        if key not in ("channels", "unexpected_failures"):
+            print(f"{key:>16}: {value}")
+    print(f"\n{'渠道':<14}{'成功':>6}{'失败':>6}{'p50(s)':>10}{'max(s)':>10}")
+    for name, item in result["channels"].items():
+        print(f"{name:<14}{item['success']:>6}{item['failure']:>6}{item['p50']:>10}{item['max']:>10}")
+    if unexpected:
+        print(f"\n未注入失败但发送失败的渠道: {', '.join(unexpected)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
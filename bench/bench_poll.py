@@ -0,0 +1,128 @@
+"""
+轮询流程离线基准测试
+
+使用 bench/fake_zzupy.py 替代真实的 CAS / 一卡通服务，测量:
+- 端到端轮询耗时（登录 + 查询 + 存储写入）
+- 每次运行的登录次数（Token 复用情况）
+- N 个房间的吞吐（房间/秒）
+
+用法:
+    python bench/bench_poll.py --rooms 1 --runs 10
+    python bench/bench_poll.py --rooms 200 --latency 0.02 --failure-rate 0.05 --json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_benchmark(args) -> dict:
+    """执行基准测试，返回结果汇总"""
+    from tenacity import wait_none
+
+    from fake_zzupy import FakeBackend
+    from monitor import EnergyMonitor
+    from storage import record_energy_data, record_room_batch
+    from timeutil import record_timestamp
+
+    backend = FakeBackend(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        token_ttl=args.token_ttl,
+        seed=args.seed,
+    )
+    rooms = [f"room-{i:04d}" for i in range(args.rooms)]
+
+    durations = []
+    logins = []
+    failed_runs = 0
+
+    for _ in range(args.runs):
+        before = backend.stats.logins
+        start = time.perf_counter()
+        # 每次运行新建监控器，模拟相互独立的 Actions 运行（仅通过 tokens.json 共享 Token）
+        monitor = EnergyMonitor(
+            backend.cas_client_cls, backend.ecard_client_cls, wait_strategy=wait_none()
+        )
+        try:
+            record_time = record_timestamp()
+            if args.rooms > 2:
+                balances = monitor.get_room_balances(rooms)
+                record_room_batch({
+                    room: {"time": record_time, "balance": balance}
+                    for room, balance in balances.items()
+                })
+            else:
+                balances = monitor.get_balance()
+                record_energy_data({"time": record_time, **balances})
+        except Exception:
+            failed_runs += 1
+        durations.append(time.perf_counter() - start)
+        logins.append(backend.stats.logins - before)
+
+    total_time = sum(durations)
+    return {
+        "rooms": args.rooms,
+        "runs": args.runs,
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "token_ttl": args.token_ttl,
+        "failed_runs": failed_runs,
+        "poll_time_mean": round(statistics.mean(durations), 4),
+        "poll_time_p50": round(statistics.median(durations), 4),
+        "poll_time_max": round(max(durations), 4),
+        "logins_per_run": round(statistics.mean(logins), 2),
+        "password_logins": backend.stats.password_logins,
+        "token_logins": backend.stats.token_logins,
+        "token_rejections": backend.stats.token_rejections,
+        "backend_failures": backend.stats.failures,
+        "queries": backend.stats.queries,
+        "rooms_per_second": round(args.rooms * args.runs / total_time, 2) if total_time else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="轮询流程离线基准测试")
+    parser.add_argument("--rooms", type=int, default=2, help="房间数（1~2 为默认照明+空调模式）")
+    parser.add_argument("--runs", type=int, default=10, help="运行次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次请求平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动比例")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="请求失败概率")
+    parser.add_argument("--token-ttl", type=float, default=3600.0, help="Token 有效期（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # 默认模式下照明、空调房间由环境变量提供
+    os.environ.setdefault("LIGHT_ROOM", "light-room")
+    os.environ.setdefault("AC_ROOM", "ac-room")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "page", "data"))
+        os.chdir(workdir)
+        try:
+            result = run_benchmark(args)
+        finally:
+            os.chdir(cwd)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:>18}: {value}")
+    return 0 if result["failed_runs"] < args.runs else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+启动耗时基准测试
+
+在子进程中以 `python -X importtime` 导入 main，解析导入耗时，检查:
+- `import main` 的累计导入耗时（多次取中位数）
+- 耗时最多的模块
+- 重量级依赖（requests、zzupy、tenacity、smtplib、email.mime、http.server 等）
+  没有在启动阶段被导入
+- 缺少环境变量时 `python main.py` 的冷启动失败耗时
+
+用法:
+    python bench/bench_startup.py
+    python bench/bench_startup.py --runs 10 --budget-ms 80 --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动阶段不应导入的模块（按需在轮询、通知或常驻模式中加载）
+LAZY_MODULES = (
+    "requests",
+    "urllib3",
+    "zzupy",
+    "tenacity",
+    "smtplib",
+    "email.mime",
+    "http.server",
+    "monitor",
+    "notify",
+)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def clean_env() -> dict:
+    """去掉账号、通知等配置，模拟未配置的冷启动"""
+    return {
+        key: value
+        for key, value in os.environ.items()
+        if key in ("PATH", "HOME", "LANG", "PYTHONPATH", "SYSTEMROOT")
+    }
+
+
+def measure_import() -> tuple:
+    """
+    运行一次 `python -X importtime -c "import main"`
+
+    Returns:
+        (main 的累计导入耗时 µs, {模块名: (自身耗时 µs, 累计耗时 µs)})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        env=clean_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules["main"][1], modules
+
+
+def measure_cold_fail() -> float:
+    """缺少 ACCOUNT 等环境变量时，`python main.py` 退出所需时间（秒）"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "main.py"],
+        cwd=ROOT,
+        env=clean_env(),
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的模块数")
+    parser.add_argument("--budget-ms", type=float, default=0, help="import main 耗时上限（毫秒），0 为不检查")
+    args = parser.parse_args()
+
+    totals = []
+    modules = {}
+    for _ in range(args.runs):
+        total, modules = measure_import()
+        totals.append(total)
+    cold = [measure_cold_fail() for _ in range(args.runs)]
+
+    import_ms = statistics.median(totals) / 1000
+    print(f"import main (p50): {import_ms:.1f} ms")
+    print(f"缺少配置时退出 (p50): {statistics.median(cold) * 1000:.1f} ms")
+
+    print(f"\n累计耗时最多的 {args.top} 个模块（最后一次测量）:")
+    ranked = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (own, cumulative) in ranked[: args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  (自身 {own / 1000:>6.1f} ms)  {name}")
+
+    failed = False
+    eager = sorted(
+        name for name in modules
+        if any(name == lazy or name.startswith(f"{lazy}.") for lazy in LAZY_MODULES)
+    )
+    if eager:
+        print(f"\n⚠️ 启动阶段导入了应延迟加载的模块: {', '.join(eager)}")
+        failed = True
+
+    if args.budget_ms and import_ms > args.budget_ms:
+        print(f"\n⚠️ import main 耗时 {import_ms:.1f} ms 超过上限 {args.budget_ms} ms")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
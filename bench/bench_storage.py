@@ -0,0 +1,245 @@
+"""
+存储层微基准测试
+
+按 月份数 × 房间数 × 采样间隔 生成合成历史数据，测量:
+- 单次追加延迟（record_energy_data + update_time_list + update_last_records）
+- 每次追加重写的字节数
+- 追加过程的峰值内存
+- 目录扫描（update_time_list）耗时
+- 多房间批量写入（record_room_batch）延迟与字节数
+
+结果可保存为基线（bench/baselines/storage.json，连同月份数、房间数等运行参数），
+之后参数相同的运行会与基线对比；参数不同时拒绝对比。
+
+用法:
+    python bench/bench_storage.py
+    python bench/bench_storage.py --intervals 5 --months 24 --rooms 100
+    python bench/bench_storage.py --save-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "storage.json")
+
+# 与基线相比超过该比例视为性能回退
+REGRESSION_RATIO = 1.25
+
+
+def synth_month(month_start: datetime, interval_minutes: int, room_mode: bool) -> list:
+    """生成一个月的合成记录"""
+    records = []
+    current = month_start
+    light, ac = 200.0, 200.0
+    while current.month == month_start.month:
+        time_str = current.strftime("%m-%d %H:%M:%S")
+        if room_mode:
+            records.append({"time": time_str, "balance": round(light, 2)})
+        else:
+            records.append({"time": time_str, "light_Balance": round(light, 2), "ac_Balance": round(ac, 2)})
+        light = max(0.0, light - 0.01)
+        ac = max(0.0, ac - 0.02)
+        current += timedelta(minutes=interval_minutes)
+    return records
+
+
+def month_starts(current_month: str, months: int) -> list:
+    """当前月及之前 months-1 个月的月初时间（从旧到新）"""
+    year, month = map(int, current_month.split("-"))
+    starts = []
+    for _ in range(months):
+        starts.append(datetime(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return list(reversed(starts))
+
+
+def write_json(file_path: str, data) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def storage_bytes_since(report, start_index: int) -> int:
+    """统计运行报告中自 start_index 起 storage.write 写入的字节数"""
+    return sum(
+        entry.get("attrs", {}).get("bytes", 0)
+        for entry in report.spans[start_index:]
+        if entry["name"] == "storage.write"
+    )
+
+
+def bench_interval(interval: int, args) -> dict:
+    """单个采样间隔下的全部测量"""
+    import storage
+    from timeutil import month_key
+    from timing import report
+
+    current_month = month_key()
+    starts = month_starts(current_month, args.months)
+
+    # ---------- 默认布局：照明 + 空调 ----------
+    for start in starts:
+        write_json(
+            os.path.join(storage.DATA_DIR, f"{start:%Y-%m}.json"),
+            synth_month(start, interval, room_mode=False),
+        )
+    entries = len(synth_month(starts[-1], interval, room_mode=False))
+
+    def append_once():
+        storage.record_energy_data({"time": "01-01 00:00:00", "light_Balance": 1.0, "ac_Balance": 1.0})
+        storage.update_time_list()
+        storage.update_last_records()
+
+    append_once()  # 预热：冻结历史月份
+    latencies = []
+    written = []
+    for _ in range(args.repeat):
+        index = len(report.spans)
+        start = time.perf_counter()
+        append_once()
+        latencies.append(time.perf_counter() - start)
+        written.append(storage_bytes_since(report, index))
+
+    tracemalloc.start()
+    append_once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    scans = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        storage.update_time_list()
+        scans.append(time.perf_counter() - start)
+
+    result = {
+        "entries_per_month": entries,
+        "append_latency_ms": round(statistics.median(latencies) * 1000, 3),
+        "append_bytes": int(statistics.median(written)),
+        "append_peak_kib": round(peak / 1024, 1),
+        "scan_latency_ms": round(statistics.median(scans) * 1000, 3),
+    }
+
+    # ---------- 多房间布局：批量写入 ----------
+    if args.rooms:
+        rooms = [f"room-{i:04d}" for i in range(args.rooms)]
+        for room in rooms:
+            room_dir = storage.get_room_dir(room)
+            for start in starts[-2:]:
+                write_json(
+                    os.path.join(room_dir, f"{start:%Y-%m}.json"),
+                    synth_month(start, interval, room_mode=True),
+                )
+        batch = {room: {"time": "01-01 00:00:00", "balance": 1.0} for room in rooms}
+
+        storage.record_room_batch(batch)
+        batch_latencies = []
+        batch_written = []
+        for _ in range(args.repeat):
+            index = len(report.spans)
+            start = time.perf_counter()
+            storage.record_room_batch(batch)
+            batch_latencies.append(time.perf_counter() - start)
+            batch_written.append(storage_bytes_since(report, index))
+
+        tracemalloc.start()
+        storage.record_room_batch(batch)
+        _, batch_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result.update({
+            "rooms": args.rooms,
+            "batch_latency_ms": round(statistics.median(batch_latencies) * 1000, 3),
+            "batch_bytes": int(statistics.median(batch_written)),
+            "batch_peak_kib": round(batch_peak / 1024, 1),
+        })
+
+    report.reset()
+    return result
+
+
+def run_params(args) -> dict:
+    """影响测量结果的运行参数（采样间隔体现在场景名中）"""
+    return {"months": args.months, "rooms": args.rooms}
+
+
+def compare(results: dict, baseline: dict) -> bool:
+    """与基线对比，返回是否存在回退"""
+    regressed = False
+    print("\n与基线对比:")
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            print(f"  {scenario}: 基线中无此场景")
+            continue
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            ratio = value / old
+            mark = ""
+            if ratio > REGRESSION_RATIO and not key.startswith(("entries", "rooms")):
+                mark = "  ⚠️ 回退"
+                regressed = True
+            print(f"  {scenario:>12} {key:>20}: {old:>12} -> {value:>12} ({ratio:.2f}x){mark}")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="存储层微基准测试")
+    parser.add_argument("--months", type=int, default=6, help="历史月份数")
+    parser.add_argument("--rooms", type=int, default=20, help="多房间布局房间数，0 为跳过")
+    parser.add_argument(
+        "--intervals", type=int, nargs="+", default=[240, 60, 5], help="采样间隔（分钟）"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量重复次数")
+    parser.add_argument("--save-baseline", action="store_true", help="将结果保存为基线")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = {}
+    cwd = os.getcwd()
+    for interval in args.intervals:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.makedirs(os.path.join(workdir, "page", "data"))
+            os.chdir(workdir)
+            try:
+                results[f"every_{interval}m"] = bench_interval(interval, args)
+            finally:
+                os.chdir(cwd)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    params = run_params(args)
+    if args.save_baseline:
+        write_json(args.baseline, {"params": params, "results": results})
+        print(f"\n基线已保存: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            print(
+                f"\n⚠️ 运行参数 {params} 与基线 {baseline.get('params')} 不同，不进行对比"
+                f"（可使用 --save-baseline 重新生成基线）"
+            )
+            return 2
+        return 1 if compare(results, baseline["results"]) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
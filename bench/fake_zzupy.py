@@ -0,0 +1,196 @@
+"""
+离线的 ZZU CAS / 一卡通替身
+
+与 zzupy.app 的 CASClient / ECardClient 接口一致，可配置延迟、失败率和 Token 过期时间，
+并统计登录与查询次数，用于在无网络环境下测量轮询流程的性能。
+
+用法:
+    backend = FakeBackend(latency=0.05, failure_rate=0.1, token_ttl=3600)
+    monitor = EnergyMonitor(backend.cas_client_cls, backend.ecard_client_cls)
+"""
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+class FakeBackendError(ConnectionError):
+    """模拟的网络/服务端错误"""
+
+
+@dataclass
+class FakeStats:
+    """后端调用统计"""
+
+    password_logins: int = 0
+    token_logins: int = 0
+    token_rejections: int = 0
+    ecard_logins: int = 0
+    queries: int = 0
+    failures: int = 0
+
+    @property
+    def logins(self) -> int:
+        return self.password_logins + self.token_logins + self.ecard_logins
+
+
+@dataclass
+class FakeBackend:
+    """
+    替身后端
+
+    Attributes:
+        latency: 每次请求的平均延迟（秒）
+        jitter: 延迟抖动比例，实际延迟在 latency * (1 ± jitter) 之间
+        failure_rate: 每次请求失败的概率
+        token_ttl: 已签发 Token 的有效期（秒），过期后需密码登录
+        seed: 随机数种子，保证基准测试可复现
+    """
+
+    latency: float = 0.05
+    jitter: float = 0.2
+    failure_rate: float = 0.0
+    token_ttl: float = 3600.0
+    seed: Optional[int] = 0
+    stats: FakeStats = field(default_factory=FakeStats)
+    balances: Dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, float] = {}  # user_token -> 签发时间
+
+    def request(self) -> None:
+        """模拟一次网络请求：等待延迟，按失败率抛出异常"""
+        with self._lock:
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+            failed = self._rng.random() < self.failure_rate
+        time.sleep(max(0.0, delay))
+        if failed:
+            with self._lock:
+                self.stats.failures += 1
+            raise FakeBackendError("模拟的后端错误")
+
+    def issue_token(self) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.monotonic()
+        return token
+
+    def token_valid(self, token: Optional[str]) -> bool:
+        with self._lock:
+            issued = self._tokens.get(token)
+        return issued is not None and time.monotonic() - issued < self.token_ttl
+
+    def expire_tokens(self) -> None:
+        """使所有已签发 Token 立即失效"""
+        with self._lock:
+            self._tokens.clear()
+
+    def balance_of(self, room: str) -> float:
+        with self._lock:
+            if room not in self.balances:
+                self.balances[room] = round(self._rng.uniform(5, 200), 2)
+            self.balances[room] = round(max(0.0, self.balances[room] - 0.01), 2)
+            return self.balances[room]
+
+    @property
+    def cas_client_cls(self):
+        backend = self
+
+        class BoundCASClient(FakeCASClient):
+            _backend = backend
+
+        return BoundCASClient
+
+    @property
+    def ecard_client_cls(self):
+        backend = self
+
+        class BoundECardClient(FakeECardClient):
+            _backend = backend
+
+        return BoundECardClient
+
+
+class FakeCASClient:
+    """CASClient 替身"""
+
+    _backend: FakeBackend
+
+    def __init__(self, account: str, password: str) -> None:
+        self.account = account
+        self.password = password
+        self.user_token: Optional[str] = None
+        self.refresh_token: Optional[str] = None
+        self.logged_in = False
+
+    def set_token(self, user_token: str, refresh_token: str) -> None:
+        self.user_token = user_token
+        self.refresh_token = refresh_token
+
+    def login(self) -> None:
+        backend = self._backend
+        backend.request()
+
+        if self.user_token:
+            with backend._lock:
+                backend.stats.token_logins += 1
+            if backend.token_valid(self.user_token):
+                self.logged_in = True
+                return
+            with backend._lock:
+                backend.stats.token_rejections += 1
+            # 与 zzupy 一致：Token 失效后清空，下次 login 使用账号密码
+            self.user_token = None
+            self.refresh_token = None
+            self.logged_in = False
+            return
+
+        with backend._lock:
+            backend.stats.password_logins += 1
+        self.user_token = backend.issue_token()
+        self.refresh_token = uuid.uuid4().hex
+        self.logged_in = True
+
+    def close(self) -> None:
+        pass
+
+
+class FakeECardClient:
+    """ECardClient 替身"""
+
+    _backend: FakeBackend
+
+    def __init__(self, cas_client: FakeCASClient) -> None:
+        self.cas_client = cas_client
+        self.logged_in = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def login(self) -> None:
+        backend = self._backend
+        if not self.cas_client.logged_in:
+            raise FakeBackendError("CAS 未登录")
+        backend.request()
+        with backend._lock:
+            backend.stats.ecard_logins += 1
+        self.logged_in = True
+
+    def get_remaining_energy(self, room: Optional[str] = None) -> float:
+        backend = self._backend
+        if not self.logged_in:
+            raise FakeBackendError("一卡通未登录")
+        backend.request()
+        with backend._lock:
+            backend.stats.queries += 1
+        return backend.balance_of(room or "default")
+
+    def close(self) -> None:
+        self.logged_in = False
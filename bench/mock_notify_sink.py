@@ -0,0 +1,322 @@
+"""
+本地通知接收端（Mock Sink）
+
+在本机模拟 notify.py 中全部通知渠道的服务端，按各服务商真实的成功/失败响应格式返回，
+支持注入延迟与失败率，用于在不访问真实服务的情况下测试分发吞吐与重试行为。
+
+HTTP 渠道按路径前缀区分（如 http://127.0.0.1:PORT/telegram/...），
+邮件渠道使用内置的明文 SMTP 接收端。
+
+用法:
+    sink = MockSink(failure_rate=0.2, latency=0.01)
+    sink.start()
+    os.environ.update(sink.env())   # 需在导入 config / notify 之前
+    ...
+    sink.stop()
+
+也可单独运行: python bench/mock_notify_sink.py --port 8765
+"""
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+# 各渠道的成功 / 失败响应: provider -> ((status, body), (status, body))
+# body 为 dict 时按 JSON 返回，为 str 时按纯文本返回
+RESPONSES: Dict[str, Tuple[Tuple[int, object], Tuple[int, object]]] = {
+    "telegram": (
+        (200, {"ok": True, "result": {"message_id": 1}}),
+        (429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1"}),
+    ),
+    "serverchan": (
+        (200, {"code": 0, "message": "", "data": {"pushid": "1"}}),
+        (200, {"code": 40001, "message": "bad pushtoken"}),
+    ),
+    "bark": (
+        (200, {"code": 200, "message": "success", "timestamp": 0}),
+        (400, {"code": 400, "message": "failed to push", "timestamp": 0}),
+    ),
+    "dingtalk": (
+        (200, {"errcode": 0, "errmsg": "ok"}),
+        (200, {"errcode": 310000, "errmsg": "sign not match"}),
+    ),
+    "feishu": (
+        (200, {"code": 0, "msg": "success", "data": {}}),
+        (200, {"code": 19021, "msg": "sign match fail or timestamp is not within one hour"}),
+    ),
+    "gocqhttp": (
+        (200, {"status": "ok", "retcode": 0, "data": {"message_id": 1}}),
+        (200, {"status": "failed", "retcode": 100, "message": "user not found"}),
+    ),
+    "gotify": (
+        (200, {"id": 1, "appid": 1, "message": "ok", "priority": 5}),
+        (401, {"error": "Unauthorized", "errorCode": 401, "errorDescription": "invalid token"}),
+    ),
+    "igot": (
+        (200, {"ret": 0, "data": {"id": "1"}, "errMsg": ""}),
+        (200, {"ret": 201, "errMsg": "key invalid"}),
+    ),
+    "pushdeer": (
+        (200, {"code": 0, "content": {"result": ["ok"]}}),
+        (200, {"code": 80403, "error": "key invalid"}),
+    ),
+    "synology": (
+        (200, {"success": True}),
+        (200, {"success": False, "error": {"code": 404, "errors": "invalid token"}}),
+    ),
+    "pushplus": (
+        (200, {"code": 200, "msg": "请求成功", "data": "1"}),
+        (200, {"code": 900, "msg": "用户账号使用受限"}),
+    ),
+    "wecom": (
+        (200, {"errcode": 0, "errmsg": "ok"}),
+        (200, {"errcode": 42001, "errmsg": "access_token expired"}),
+    ),
+    "qmsg": (
+        (200, {"success": True, "code": 0, "reason": "操作成功"}),
+        (200, {"success": False, "code": 500, "reason": "消息发送过于频繁"}),
+    ),
+    "aibotk": (
+        (200, {"code": 0, "message": "success"}),
+        (200, {"code": 1, "message": "apikey 无效"}),
+    ),
+    "pushme": (
+        (200, "success"),
+        (200, "push_key error"),
+    ),
+    "chronocat": (
+        (200, {"result": 0}),
+        (500, {"message": "internal error"}),
+    ),
+    "ntfy": (
+        (200, {"id": "1", "event": "message"}),
+        (429, {"code": 42901, "http": 429, "error": "limit reached: too many requests"}),
+    ),
+    "webhook": (
+        (200, {"ok": True}),
+        (500, {"error": "internal error"}),
+    ),
+}
+
+WECOM_TOKEN = {"errcode": 0, "errmsg": "ok", "access_token": "mock-access-token", "expires_in": 7200}
+
+
+class MockSink:
+    """通知渠道 Mock 服务"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        smtp_port: int = 0,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_rates: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = 0,
+    ):
+        """
+        Args:
+            host: 监听地址
+            port: HTTP 端口，0 为随机
+            smtp_port: SMTP 端口，0 为随机
+            latency: 每次请求的响应延迟（秒）
+            failure_rate: 默认失败概率
+            failure_rates: 按渠道覆盖失败概率
+            seed: 随机数种子
+        """
+        self.host = host
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_rates = failure_rates or {}
+        self.requests: Counter = Counter()
+        self.failures: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._http = ThreadingHTTPServer((host, port), self._http_handler())
+        self._smtp = _ThreadingTCPServer((host, smtp_port), self._smtp_handler())
+        self._threads = []
+
+    @property
+    def port(self) -> int:
+        return self._http.server_address[1]
+
+    @property
+    def smtp_port(self) -> int:
+        return self._smtp.server_address[1]
+
+    def base_url(self, provider: str) -> str:
+        return f"http://{self.host}:{self.port}/{provider}"
+
+    def should_fail(self, provider: str) -> bool:
+        """记录一次请求，并按失败率决定是否返回失败响应"""
+        rate = self.failure_rates.get(provider, self.failure_rate)
+        with self._lock:
+            self.requests[provider] += 1
+            failed = self._rng.random() < rate
+            if failed:
+                self.failures[provider] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return failed
+
+    def env(self) -> Dict[str, str]:
+        """将全部渠道指向本 Mock 服务的环境变量"""
+        return {
+            "TELEGRAM_BOT_TOKEN": "mock", "TELEGRAM_CHAT_ID": "1",
+            "TELEGRAM_API_URL": self.base_url("telegram"),
+            "SERVERCHAN_KEYS": "mock-key", "SERVERCHAN_API_URL": self.base_url("serverchan"),
+            "EMAIL": "mock@example.com", "SMTP_CODE": "mock", "SMTP_SERVER": self.host,
+            "SMTP_PORT": str(self.smtp_port), "SMTP_SSL": "false",
+            "BARK_KEY": "mock", "BARK_URL": self.base_url("bark"),
+            "DINGTALK_WEBHOOK": f"{self.base_url('dingtalk')}/robot/send?access_token=mock",
+            "FEISHU_WEBHOOK": f"{self.base_url('feishu')}/open-apis/bot/v2/hook/mock",
+            "GOCQHTTP_URL": self.base_url("gocqhttp"), "GOCQHTTP_TARGET": "10000",
+            "GOTIFY_URL": self.base_url("gotify"), "GOTIFY_TOKEN": "mock",
+            "IGOT_KEY": "mock", "IGOT_API_URL": self.base_url("igot"),
+            "PUSHDEER_KEY": "mock", "PUSHDEER_API_URL": self.base_url("pushdeer"),
+            "SYNOLOGY_CHAT_URL": f"{self.base_url('synology')}/webapi/entry.cgi",
+            "SYNOLOGY_CHAT_TOKEN": "mock",
+            "PUSHPLUS_TOKEN": "mock", "PUSHPLUS_API_URL": self.base_url("pushplus"),
+            "WECOM_CORP_ID": "mock", "WECOM_AGENT_ID": "1", "WECOM_SECRET": "mock",
+            "WECOM_API_URL": self.base_url("wecom"),
+            "QMSG_KEY": "mock", "QMSG_API_URL": self.base_url("qmsg"),
+            "AIBOTK_KEY": "mock", "AIBOTK_TARGET": "mock", "AIBOTK_API_URL": self.base_url("aibotk"),
+            "PUSHME_KEY": "mock", "PUSHME_API_URL": self.base_url("pushme"),
+            "CHRONOCAT_URL": self.base_url("chronocat"), "CHRONOCAT_TARGET": "10000",
+            "NTFY_TOPIC": "mock", "NTFY_URL": self.base_url("ntfy"),
+            "WEBHOOK_URL": self.base_url("webhook"),
+        }
+
+    def start(self) -> "MockSink":
+        for server, name in ((self._http, "mock-http"), (self._smtp, "mock-smtp")):
+            thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in (self._http, self._smtp):
+            server.shutdown()
+            server.server_close()
+
+    def _http_handler(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+
+                provider = self.path.lstrip("/").split("/", 1)[0].split("?", 1)[0]
+                if provider not in RESPONSES:
+                    self._reply(404, {"error": f"unknown provider: {provider}"})
+                    return
+
+                # 企业微信 gettoken 单独计数，不注入失败
+                if provider == "wecom" and "/cgi-bin/gettoken" in self.path:
+                    with sink._lock:
+                        sink.requests["wecom.gettoken"] += 1
+                    self._reply(200, WECOM_TOKEN)
+                    return
+
+                success, failure = RESPONSES[provider]
+                status, body = failure if sink.should_fail(provider) else success
+                self._reply(status, body)
+
+            def _reply(self, status: int, body) -> None:
+                if isinstance(body, str):
+                    data, content_type = body.encode("utf-8"), "text/plain; charset=utf-8"
+                else:
+                    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _smtp_handler(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            """最小 SMTP 会话：EHLO / AUTH / MAIL / RCPT / DATA / QUIT"""
+
+            def _send(self, line: str) -> None:
+                self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+            def handle(self):
+                self._send("220 mock-smtp ready")
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode("utf-8", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+
+                    if verb in ("EHLO", "HELO"):
+                        self._send("250-mock-smtp")
+                        self._send("250 AUTH PLAIN LOGIN")
+                    elif verb == "AUTH":
+                        self._send("235 2.7.0 Authentication successful")
+                    elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                        self._send("250 OK")
+                    elif verb == "DATA":
+                        self._send("354 End data with <CR><LF>.<CR><LF>")
+                        while self.rfile.readline() not in (b".\r\n", b""):
+                            pass
+                        if sink.should_fail("email"):
+                            self._send("451 4.3.0 Temporary server error")
+                        else:
+                            self._send("250 OK queued")
+                    elif verb == "QUIT":
+                        self._send("221 Bye")
+                        return
+                    else:
+                        self._send("502 Command not implemented")
+
+        return Handler
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地通知接收端")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP 端口")
+    parser.add_argument("--smtp-port", type=int, default=8025, help="SMTP 端口")
+    parser.add_argument("--latency", type=float, default=0.0, help="响应延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="失败概率")
+    args = parser.parse_args()
+
+    sink = MockSink(
+        port=args.port, smtp_port=args.smtp_port,
+        latency=args.latency, failure_rate=args.failure_rate,
+    ).start()
+    print("将以下环境变量指向本服务:")
+    for key, value in sink.env().items():
+        print(f"export {key}='{value}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
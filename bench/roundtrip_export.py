@@ -0,0 +1,133 @@
+"""
+历史数据导出往返测试
+
+在临时数据目录中生成默认布局（照明 + 空调）与整栋楼布局的历史读数，
+以很小的块大小分别导出为 CSV / Parquet / Arrow（多块、多个 RecordBatch / Row Group），
+再读回校验行数与内容与 iter_rows 一致。未安装 pyarrow 时只校验 CSV。
+
+用法:
+    python bench/roundtrip_export.py [--rows 2000] [--chunk-size 500]
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROOMS = ("101", "102", "103")
+
+
+def synth_history(rows: int) -> None:
+    """生成跨越多个月份的默认布局记录与整栋楼布局记录"""
+    import storage
+
+    months = {}
+    current = datetime(2025, 1, 1)
+    for i in range(rows):
+        months.setdefault(f"{current:%Y-%m}", []).append({
+            "time": current.strftime("%m-%d %H:%M:%S"),
+            "light_Balance": round(200 - i * 0.01, 2),
+            "ac_Balance": round(300 - i * 0.02, 2),
+        })
+        current += timedelta(hours=1)
+    for month, records in months.items():
+        with open(os.path.join(storage.DATA_DIR, f"{month}.json"), "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+    storage.update_time_list()
+
+    for i in range(rows // 10):
+        recorded_at = datetime(2025, 1, 1) + timedelta(hours=i)
+        storage.record_room_batch({
+            room: {"time": recorded_at.strftime("%m-%d %H:%M:%S"), "balance": round(100 - i * 0.1 - n, 2)}
+            for n, room in enumerate(ROOMS)
+        })
+
+
+def to_float32(value: float) -> float:
+    """按 float32 精度取整，与 Parquet / Arrow 中的 balance 列一致"""
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def read_back(output: str, fmt: str) -> list:
+    """读回导出文件，返回 (序列键, Unix 时间戳, 余额) 列表"""
+    if fmt == "csv":
+        with open(output, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            return [(key, int(ts), float(balance)) for key, ts, balance in reader]
+
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(output)
+    else:
+        with pa.ipc.open_file(output) as reader:
+            table = reader.read_all()
+    columns = table.to_pydict()
+    return [
+        (key, int(moment.timestamp()), float(balance))
+        for key, moment, balance in zip(columns["series"], columns["timestamp"], columns["balance"])
+    ]
+
+
+def run(args) -> int:
+    """生成数据并校验各格式的往返结果"""
+    from export import export_history, iter_rows
+
+    synth_history(args.rows)
+    expected = list(iter_rows())
+
+    formats = ("csv", "parquet", "arrow")
+    if importlib.util.find_spec("pyarrow") is None:
+        print("未安装 pyarrow，仅校验 CSV")
+        formats = ("csv",)
+
+    failed = []
+    for fmt in formats:
+        output = f"history.{fmt}"
+        count = export_history(output, fmt, chunk_size=args.chunk_size)
+        rows = read_back(output, fmt)
+        # Parquet / Arrow 中的余额为 float32
+        target = expected if fmt == "csv" else [(key, ts, to_float32(balance)) for key, ts, balance in expected]
+        ok = count == len(expected) and rows == target
+        chunks = -(-count // args.chunk_size)
+        print(f"{'✅' if ok else '❌'} {fmt}: {count} 行, {chunks} 块")
+        if not ok:
+            failed.append(fmt)
+
+    if failed:
+        print(f"❌ 往返校验失败: {', '.join(failed)}")
+        return 1
+    print("✅ 往返校验通过")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="历史数据导出往返测试")
+    parser.add_argument("--rows", type=int, default=2000, help="默认布局的读数条数")
+    parser.add_argument("--chunk-size", type=int, default=500, help="导出块大小")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "page", "data"))
+        os.chdir(workdir)
+        try:
+            return run(args)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+存储层多进程压力测试
+
+多个进程同时执行 record_energy_data / update_time_list / update_last_records，
+结束后校验月份文件完整、记录数无丢失。
+
+用法:
+    python bench/stress_storage.py [--procs 8] [--writes 50]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def worker(workdir: str, worker_id: int, writes: int) -> None:
+    """单个写入进程"""
+    os.chdir(workdir)
+    from storage import record_energy_data, update_last_records
+
+    for i in range(writes):
+        record_energy_data({
+            "time": f"{worker_id}-{i}",
+            "light_Balance": float(worker_id),
+            "ac_Balance": float(i),
+        })
+        update_last_records()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="存储层多进程压力测试")
+    parser.add_argument("--procs", type=int, default=8, help="并发进程数")
+    parser.add_argument("--writes", type=int, default=50, help="每个进程写入次数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "page", "data"))
+
+        start = time.perf_counter()
+        procs = [
+            Process(target=worker, args=(workdir, i, args.writes))
+            for i in range(args.procs)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        failed = [p.exitcode for p in procs if p.exitcode != 0]
+        data_dir = os.path.join(workdir, "page", "data")
+        month_files = [
+            f for f in os.listdir(data_dir)
+            if len(f) == len("YYYY-MM.json") and f.endswith(".json")
+        ]
+
+        records = []
+        for name in month_files:
+            with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+                records.extend(json.load(f))
+
+        expected = args.procs * args.writes
+        unique = {r["time"] for r in records}
+        print(f"进程数: {args.procs}, 每进程写入: {args.writes}")
+        print(f"耗时: {elapsed:.2f}s, 吞吐: {expected / elapsed:.1f} 次/秒")
+        print(f"期望记录: {expected}, 实际记录: {len(records)}, 去重后: {len(unique)}")
+
+        if failed or len(records) != expected or len(unique) != expected:
+            print(f"❌ 压力测试失败 (异常退出进程: {len(failed)})")
+            return 1
+
+    print("✅ 压力测试通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
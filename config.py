@@ -11,6 +11,46 @@ TOKEN_FILE = os.path.join(DATA_DIR, "tokens.json")
 TOKEN_ENC_FILE = os.path.join(DATA_DIR, "tokens.enc")
 TIME_FILE = os.path.join(DATA_DIR, "time.json")
 LAST_RECORDS_FILE = os.path.join(DATA_DIR, "last_30_records.json")
+ROOM_INDEX_FILE = os.path.join(DATA_DIR, "rooms.json")  # 多房间布局共享索引
+LATEST_FILE = os.path.join(DATA_DIR, "latest.json")  # 各房间最新读数、趋势与消耗速率
+LEDGER_FILE = os.path.join(DATA_DIR, "ledger.json")  # 按天汇总的用电 / 充值 / 数据缺失账本
+BASELINE_FILE = os.path.join(DATA_DIR, "baselines.json")  # 各房间按小时的消耗速率基线（异常检测）
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")  # 按月的 "星期 × 小时" 用电画像
+LAST_RECORDS_COUNT = 30  # 每个房间保留的最近记录数
+BACKUP_DIR = os.path.join(DATA_DIR, ".backup")  # 滚动备份（每个文件保留上一版本）
+LOCK_FILE = os.path.join(DATA_DIR, ".lock")  # 多进程写入互斥锁
+
+# 本地缓存（不发布到 page 分支，工作流通过 actions/cache 在运行之间保留）
+CACHE_DIR = os.getenv("CACHE_DIR") or "./.cache"
+LATENCY_FILE = os.path.join(CACHE_DIR, "latency.json")  # 一卡通接口延迟直方图（对冲请求阈值）
+
+# 通知渠道临时凭证（如企业微信 access_token）提前刷新的秒数，避免发送途中过期
+TOKEN_REFRESH_MARGIN = 300
+
+# 数据目录加锁等待超时（秒）
+LOCK_TIMEOUT = 60
+
+# 消耗速率的指数平滑系数（0~1，越大越偏向最近一次变化）
+RATE_SMOOTHING = 0.5
+
+# 重复读数压缩（可选，分钟）：余额未变化时并入上一条记录（记为 until/repeat），
+# 超过该间隔后重新写入一条完整记录作为心跳；0 为关闭，每次都追加完整记录
+RECORD_HEARTBEAT = int(os.getenv("RECORD_HEARTBEAT") or 0)
+
+# 相邻读数间隔超过该小时数时，余额变化记为数据缺失（gap），不计入用电或充值
+LEDGER_GAP_HOURS = 12
+
+# 用电异常检测：消耗速率达到同时段基线的 ANOMALY_FACTOR 倍时报警
+ANOMALY_FACTOR = float(os.getenv("ANOMALY_FACTOR") or 3.0)
+ANOMALY_MIN_RATE = 0.3  # 低于该速率（度/小时）不报警，避免基线接近 0 时误报
+ANOMALY_MIN_SAMPLES = 3  # 同时段基线样本数不足时只学习、不判断
+ANOMALY_WINDOW = 14  # 基线的平滑窗口（样本数），越大越稳定
+
+# 历史导出（export.py）每块写出的行数，决定导出时的内存占用
+EXPORT_CHUNK_SIZE = 65536
+
+# 已结束月份的内容哈希文件名长度（如 2025-01.3f2a9c1b.json）
+MONTH_HASH_LENGTH = 8
 
 # 重试配置
 RETRY_ATTEMPTS = 5
@@ -18,28 +58,71 @@ RETRY_MULTIPLIER = 1
 INITIAL_WAIT = 15
 MAX_WAIT = 120
 
+# 运行时间预算（可选，秒）：获取电量与发送通知的重试等待共用，保证单次运行在 CI 时限内结束
+RUN_DEADLINE = int(os.getenv("RUN_DEADLINE") or 0)  # 单次运行最长时间，0 为不限
+RETRY_BUDGET = int(os.getenv("RETRY_BUDGET") or 0)  # 所有重试等待合计的最长时间，0 为不限
+DEADLINE_RESERVE = 120  # 距截止时间不足该秒数时，按优先级从低到高逐步放弃通知渠道
+
+# 一卡通对冲请求（可选）：查询超过近期延迟分位数仍未返回时发出重复请求，先返回者胜出
+ECARD_HEDGE = (os.getenv("ECARD_HEDGE") or "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE") or 0.9)  # 触发对冲的延迟分位数
+HEDGE_DEFAULT_DELAY = 3.0  # 延迟样本不足时的对冲等待（秒）
+HEDGE_MIN_SAMPLES = 10  # 使用分位数阈值所需的最少样本数
+HEDGE_DECAY = 0.98  # 每个新样本使旧样本权重衰减的系数，越小越偏向近期延迟
+
+# 余额缓存（命令行查询、/balance 接口）：最新读数在 TTL 内直接返回，过期后先返回旧值再后台刷新
+BALANCE_CACHE_TTL = int(os.getenv("BALANCE_CACHE_TTL") or 300)  # 秒
+BALANCE_STALE_TTL = int(os.getenv("BALANCE_STALE_TTL") or 600)  # 过期后仍可返回旧值的秒数
+
 # 时区
 TIMEZONE = "Asia/Shanghai"
 
+# 运行报告（可选，JSON 格式的各阶段耗时）
+RUN_REPORT_FILE = os.getenv("RUN_REPORT_FILE")
+
+# Prometheus 指标（可选）
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE")  # textfile collector 输出路径 (*.prom)
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0)  # 常驻模式下 /metrics 端口
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL") or 0)  # 常驻模式轮询间隔（秒），0 为单次运行
+
+# 运行流水线（可选）
+PIPELINE_SINKS = os.getenv("PIPELINE_SINKS")  # 额外的输出端，逗号分隔的 "模块:函数"
+STEP_SUMMARY_FILE = os.getenv("GITHUB_STEP_SUMMARY")  # GitHub Actions 运行摘要，Markdown 输出端写入此文件
+STATUS_FILE = os.getenv("STATUS_FILE") or os.path.join(DATA_DIR, "status.md")  # Markdown 状态表，内容变化时才重写
+
+# 读数与上次发布完全相同（余额均未变化）时不发布；距上次发布的读数超过该分钟数时仍发布一次，
+# 保留心跳，并避免账本把长时间未发布误判为数据缺失（应小于 LEDGER_GAP_HOURS）
+PUBLISH_HEARTBEAT = int(os.getenv("PUBLISH_HEARTBEAT") or 360)
+
+# 变化文件报告（可选）：本次运行需要发布的文件列表，为空时不需要发布
+CHANGES_FILE = os.getenv("CHANGES_FILE")  # 每行一个文件路径
+GITHUB_OUTPUT_FILE = os.getenv("GITHUB_OUTPUT")  # GitHub Actions 步骤输出，写入 changes=true/false
+
 # ==================== 基础环境变量 ====================
 ACCOUNT = os.getenv("ACCOUNT")
 PASSWORD = os.getenv("PASSWORD")
 LIGHT_ROOM = os.getenv("LIGHT_ROOM")  # 照明电量房间号
 AC_ROOM = os.getenv("AC_ROOM")  # 空调电量房间号
+ROOMS = os.getenv("ROOMS")  # 可选，整栋楼模式：逗号分隔的房间号列表
 
 # ==================== 通知渠道配置 ====================
 
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # 可选，默认 https://api.telegram.org
 
 # Server酱
 SERVERCHAN_KEYS = os.getenv("SERVERCHAN_KEYS")
+SERVERCHAN_API_URL = os.getenv("SERVERCHAN_API_URL")  # 可选，默认 https://sctapi.ftqq.com
 
 # 邮件
 EMAIL = os.getenv("EMAIL")
 SMTP_CODE = os.getenv("SMTP_CODE")
 SMTP_SERVER = os.getenv("SMTP_SERVER")
+SMTP_PORT = os.getenv("SMTP_PORT")  # 可选，默认 465 (SSL) / 25
+SMTP_SSL = os.getenv("SMTP_SSL")  # 可选，设为 false 使用明文 SMTP（如本地中继）
+EMAIL_TO = os.getenv("EMAIL_TO")  # 可选，收件人列表（逗号分隔），默认发送给 EMAIL
 
 # Bark (iOS)
 BARK_URL = os.getenv("BARK_URL")  # 可选，默认 https://api.day.app
@@ -64,9 +147,11 @@ GOTIFY_TOKEN = os.getenv("GOTIFY_TOKEN")
 
 # iGot
 IGOT_KEY = os.getenv("IGOT_KEY")
+IGOT_API_URL = os.getenv("IGOT_API_URL")  # 可选，默认 https://push.hellyw.com
 
 # PushDeer
 PUSHDEER_KEY = os.getenv("PUSHDEER_KEY")
+PUSHDEER_API_URL = os.getenv("PUSHDEER_API_URL")  # 可选，默认 https://api2.pushdeer.com
 
 # Synology Chat
 SYNOLOGY_CHAT_URL = os.getenv("SYNOLOGY_CHAT_URL")
@@ -74,23 +159,28 @@ SYNOLOGY_CHAT_TOKEN = os.getenv("SYNOLOGY_CHAT_TOKEN")
 
 # PushPlus
 PUSHPLUS_TOKEN = os.getenv("PUSHPLUS_TOKEN")
+PUSHPLUS_API_URL = os.getenv("PUSHPLUS_API_URL")  # 可选，默认 https://www.pushplus.plus
 
 # 企业微信
 WECOM_CORP_ID = os.getenv("WECOM_CORP_ID")
 WECOM_AGENT_ID = os.getenv("WECOM_AGENT_ID")
 WECOM_SECRET = os.getenv("WECOM_SECRET")
 WECOM_TOUSER = os.getenv("WECOM_TOUSER")  # 可选，默认 @all
+WECOM_API_URL = os.getenv("WECOM_API_URL")  # 可选，默认 https://qyapi.weixin.qq.com
 
 # Qmsg酱
 QMSG_KEY = os.getenv("QMSG_KEY")
 QMSG_QQ = os.getenv("QMSG_QQ")  # 可选
+QMSG_API_URL = os.getenv("QMSG_API_URL")  # 可选，默认 https://qmsg.zendee.cn
 
 # 智能微秘书 (Aibotk)
 AIBOTK_KEY = os.getenv("AIBOTK_KEY")
 AIBOTK_TARGET = os.getenv("AIBOTK_TARGET")
+AIBOTK_API_URL = os.getenv("AIBOTK_API_URL")  # 可选，默认 https://api-bot.aibotk.com
 
 # PushMe
 PUSHME_KEY = os.getenv("PUSHME_KEY")
+PUSHME_API_URL = os.getenv("PUSHME_API_URL")  # 可选，默认 https://push.i-i.me
 
 # Chronocat
 CHRONOCAT_URL = os.getenv("CHRONOCAT_URL")
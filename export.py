@@ -0,0 +1,220 @@
+"""
+历史数据导出模块
+
+将全部历史（或指定序列 / 时间范围）流式导出为 CSV、Parquet 或 Arrow IPC 文件，
+用于离线分析，无需再手动拼接各月份 JSON 文件。
+
+导出为长表格式，每个读数一行:
+    series     序列键（默认布局为 "light" / "ac"，整栋楼布局为房间号）
+    timestamp  Unix 时间戳（秒，int64；Parquet / Arrow 中为带时区的 timestamp[s]）
+    balance    余额（float32）
+
+读数按 EXPORT_CHUNK_SIZE 行分块写出，内存占用与历史长度无关。
+Parquet / Arrow 需要额外安装 pyarrow，CSV 仅依赖标准库。
+
+用法:
+    python export.py history.csv
+    python export.py history.parquet --series light --start 2025-01-01 --end 2025-06-30
+"""
+import argparse
+import csv
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from os import path
+from typing import Iterator, List, Optional, Tuple
+
+from config import EXPORT_CHUNK_SIZE, TIMEZONE
+from ledger import list_series
+from storage import iter_records
+from timeutil import get_timezone
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "parquet", "arrow")
+COLUMNS = ("series", "timestamp", "balance")
+
+Row = Tuple[str, int, float]
+
+
+def parse_bound(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """
+    解析命令行时间范围
+
+    Args:
+        value: "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS"
+        end: 是否为结束时间（仅日期时包含当天全部读数）
+
+    Returns:
+        带时区的时间，未指定时返回 None
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        moment = datetime.strptime(value, "%Y-%m-%d")
+        if end:
+            moment += timedelta(days=1, seconds=-1)
+    return moment.replace(tzinfo=get_timezone())
+
+
+def iter_rows(
+    series: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[Row]:
+    """
+    按序列依次流式读取读数
+
+    Args:
+        series: 只导出这些序列键，为空时导出全部
+        start: 起始时间（含）
+        end: 结束时间（含）
+
+    Yields:
+        (序列键, Unix 时间戳, 余额)
+    """
+    for key, field, room in list_series():
+        if series and key not in series:
+            continue
+        for recorded_at, record in iter_records(room, start=start, end=end):
+            balance = record.get(field)
+            if balance is not None:
+                yield key, int(recorded_at.timestamp()), float(balance)
+
+
+def iter_chunks(rows: Iterator[Row], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[Row]]:
+    """将读数按固定行数分块"""
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows: Iterator[Row], output: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """
+    分块写出 CSV
+
+    Returns:
+        写出的行数
+    """
+    count = 0
+    with open(output, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for chunk in iter_chunks(rows, chunk_size):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def write_arrow(
+    rows: Iterator[Row], output: str, fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> int:
+    """
+    分块写出 Parquet / Arrow IPC（每块一个 RecordBatch / Row Group）
+
+    series 列的字典由 list_series() 的全部序列键固定生成，各块共用同一字典
+    （Arrow IPC 文件格式不允许块之间替换字典）。
+
+    Returns:
+        写出的行数
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError(f"导出 {fmt} 需要安装 pyarrow: pip install pyarrow") from None
+
+    schema = pa.schema([
+        ("series", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("s", tz=TIMEZONE)),
+        ("balance", pa.float32()),
+    ])
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_file(output, schema)
+
+    series_keys = [key for key, _, _ in list_series()]
+    dictionary = pa.array(series_keys, pa.string())
+    indices = {key: index for index, key in enumerate(series_keys)}
+
+    count = 0
+    with writer:
+        for chunk in iter_chunks(rows, chunk_size):
+            keys, timestamps, balances = zip(*chunk)
+            key_indices = pa.array([indices[key] for key in keys], pa.int32())
+            batch = pa.RecordBatch.from_arrays([
+                pa.DictionaryArray.from_arrays(key_indices, dictionary),
+                pa.array(timestamps, pa.int64()).cast(schema.field("timestamp").type),
+                pa.array(balances, pa.float32()),
+            ], schema=schema)
+            writer.write_batch(batch)
+            count += len(chunk)
+    return count
+
+
+def export_history(
+    output: str,
+    fmt: Optional[str] = None,
+    series: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> int:
+    """
+    导出历史数据
+
+    Args:
+        output: 输出文件路径
+        fmt: csv / parquet / arrow，为空时按扩展名推断
+        series: 只导出这些序列键
+        start: 起始时间（含）
+        end: 结束时间（含）
+        chunk_size: 每块行数
+
+    Returns:
+        导出的行数
+    """
+    fmt = fmt or path.splitext(output)[1].lstrip(".").lower()
+    if fmt in ("feather", "ipc"):
+        fmt = "arrow"
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}（可选 {', '.join(FORMATS)}）")
+
+    rows = iter_rows(series, start, end)
+    if fmt == "csv":
+        count = write_csv(rows, output, chunk_size)
+    else:
+        count = write_arrow(rows, output, fmt, chunk_size)
+
+    logger.info(f"已导出 {count} 条读数到 {output}")
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="导出电量历史数据")
+    parser.add_argument("output", help="输出文件（.csv / .parquet / .arrow）")
+    parser.add_argument("--format", choices=FORMATS, help="导出格式，默认按扩展名推断")
+    parser.add_argument("--series", nargs="+", help="只导出指定序列（light / ac / 房间号）")
+    parser.add_argument("--start", help="起始时间 YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--end", help="结束时间 YYYY-MM-DD[ HH:MM:SS]，仅日期时包含当天")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="每块行数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        export_history(
+            args.output, args.format, args.series,
+            parse_bound(args.start), parse_bound(args.end, end=True), args.chunk_size,
+        )
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+对冲请求模块
+
+一卡通接口偶尔响应很慢，单个慢请求会拖住整次运行直到超时再进入重试退避。
+开启 ECARD_HEDGE 后，查询超过该接口近期延迟的 HEDGE_PERCENTILE 分位数仍未返回时，
+再发出一个相同的请求，先返回的结果胜出。
+
+各接口的延迟记录在按指数分桶的衰减直方图中（CACHE_DIR/latency.json，不发布，跨运行保留），
+旧样本的权重随新样本逐渐衰减，阈值会随接口近期表现自动调整。
+
+落后的请求不会被中断，调用方需在关闭共用的客户端之前调用 wait_stragglers() 等待其结束。
+
+latency.json 格式:
+    {"endpoints": {"ecard.get_remaining_energy": {"counts": [...], "samples": 42}}}
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from os import path
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from config import (
+    HEDGE_DECAY, HEDGE_DEFAULT_DELAY, HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, LATENCY_FILE,
+)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 延迟分桶上界（秒）：50ms 起按 1.25 倍递增至约 60 秒，最后一桶为无穷大
+HEDGE_BUCKETS = tuple(round(0.05 * 1.25 ** i, 3) for i in range(32)) + (float("inf"),)
+
+# 对冲延迟下限（秒），避免阈值过小时几乎每次都发出重复请求
+MIN_HEDGE_DELAY = 0.05
+
+
+class LatencyTracker:
+    """按接口统计延迟分布的衰减直方图"""
+
+    def __init__(self, file_path: str = LATENCY_FILE, decay: float = HEDGE_DECAY):
+        self.file_path = file_path
+        self.decay = decay
+        self._endpoints: Optional[Dict[str, Dict]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._endpoints is None:
+            from storage import load_json
+
+            data = load_json(self.file_path) if path.exists(self.file_path) else None
+            endpoints = data.get("endpoints") if isinstance(data, dict) else None
+            self._endpoints = {
+                name: entry for name, entry in (endpoints or {}).items()
+                if len(entry.get("counts") or []) == len(HEDGE_BUCKETS)
+            }
+        return self._endpoints
+
+    def observe(self, endpoint: str, seconds: float) -> None:
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            entry = self._load().setdefault(
+                endpoint, {"counts": [0.0] * len(HEDGE_BUCKETS), "samples": 0}
+            )
+            counts = entry["counts"] = [c * self.decay for c in entry["counts"]]
+            index = next(i for i, bound in enumerate(HEDGE_BUCKETS) if seconds <= bound)
+            counts[index] += 1
+            entry["samples"] += 1
+            self._dirty = True
+
+    def percentile(self, endpoint: str, q: float) -> Optional[float]:
+        """
+        估算延迟分位数（所在分桶的上界）
+
+        Args:
+            endpoint: 接口名称
+            q: 分位数 (0~1)
+
+        Returns:
+            延迟秒数，样本不足 HEDGE_MIN_SAMPLES 时返回 None
+        """
+        with self._lock:
+            entry = self._load().get(endpoint)
+            if not entry or entry["samples"] < HEDGE_MIN_SAMPLES:
+                return None
+            counts = list(entry["counts"])
+
+        target = q * sum(counts)
+        cumulative = 0.0
+        for bound, count in zip(HEDGE_BUCKETS, counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return HEDGE_BUCKETS[-2]
+
+    def threshold(self, endpoint: str) -> float:
+        """发出对冲请求前的等待秒数"""
+        estimate = self.percentile(endpoint, HEDGE_PERCENTILE)
+        if estimate is None or estimate == float("inf"):
+            return HEDGE_DEFAULT_DELAY
+        return max(MIN_HEDGE_DELAY, estimate)
+
+    def save(self) -> None:
+        """保存直方图，供之后的运行继续使用（没有新样本时不写入）"""
+        from storage import data_lock, save_json
+
+        with self._lock:
+            if not self._dirty:
+                return
+            endpoints = {
+                name: {"counts": [round(c, 4) for c in entry["counts"]], "samples": entry["samples"]}
+                for name, entry in self._load().items()
+            }
+            self._dirty = False
+        with data_lock():
+            save_json({"endpoints": endpoints}, self.file_path, indent=None, backup=False)
+
+
+latency_tracker = LatencyTracker()
+
+# 对冲中落后、仍在执行的请求
+_stragglers: List[Future] = []
+_stragglers_lock = threading.Lock()
+
+
+def wait_stragglers(timeout: Optional[float] = None) -> bool:
+    """
+    等待落后的请求结束（关闭它们共用的客户端之前调用）
+
+    Args:
+        timeout: 最长等待秒数，None 为一直等待
+
+    Returns:
+        是否全部结束
+    """
+    with _stragglers_lock:
+        pending = list(_stragglers)
+        _stragglers.clear()
+    if not pending:
+        return True
+
+    _, not_done = wait(pending, timeout=timeout)
+    if not_done:
+        logger.warning(f"{len(not_done)} 个对冲请求在 {timeout} 秒内未结束")
+        with _stragglers_lock:
+            _stragglers.extend(not_done)
+    return not not_done
+
+
+def hedged_call(endpoint: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    调用接口，超过自适应阈值仍未返回时发出一个重复请求，取先成功的结果
+
+    Args:
+        endpoint: 接口名称（延迟统计的键）
+        func: 请求函数
+        *args, **kwargs: 请求参数
+
+    Returns:
+        先成功返回的结果；两个请求都失败时抛出后失败的异常
+    """
+    def timed_call() -> T:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        latency_tracker.observe(endpoint, time.perf_counter() - start)
+        return result
+
+    delay = latency_tracker.threshold(endpoint)
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    try:
+        primary = executor.submit(timed_call)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        logger.info(f"{endpoint} 超过 {delay:.2f} 秒未返回，发出对冲请求")
+        backup = executor.submit(timed_call)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    result = "won" if future is backup else "lost"
+                    metrics.HEDGES.inc(endpoint=endpoint, result=result)
+                    with _stragglers_lock:
+                        _stragglers.extend(pending)
+                    return future.result()
+                error = future.exception()
+        metrics.HEDGES.inc(endpoint=endpoint, result="failed")
+        raise error
+    finally:
+        # 落后的请求在后台自然结束，不阻塞本次查询（由 wait_stragglers 在关闭客户端前等待）
+        executor.shutdown(wait=False)
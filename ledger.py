@@ -0,0 +1,196 @@
+"""
+消耗账本模块
+
+遍历历史读数，将相邻读数之间的余额变化分类为:
+- consumption: 余额下降（用电）
+- topup: 余额上升（充值）
+- gap: 间隔超过 LEDGER_GAP_HOURS 的变化（数据缺失期间的净变化，无法区分用电与充值）
+
+按天汇总写入 ledger.json，每个序列记录处理到的位置（cursor），之后每次运行只处理新增读数。
+
+ledger.json 格式:
+    {"series": {"light": {"cursor": {"month": "2025-01", "time": "01-04 12:00:00", "balance": 50.5},
+                          "days": {"2025-01-04": {"consumption": 1.2, "topup": 0.0, "gap": 0.0,
+                                                  "gap_hours": 0.0}}}},
+     "updated_at": "..."}
+"""
+import logging
+from os import path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import LEDGER_FILE, LEDGER_GAP_HOURS
+from storage import (
+    iter_records, list_month_files, load_json, load_room_index, locked, save_json,
+)
+from timeutil import get_cst_time, month_key, parse_record_time
+
+logger = logging.getLogger(__name__)
+
+# 默认布局中的序列：账本键 -> 记录字段
+PAIR_FIELDS = {"light": "light_Balance", "ac": "ac_Balance"}
+
+DAY_FIELDS = ("consumption", "topup", "gap", "gap_hours")
+
+
+def load_ledger() -> Dict:
+    """
+    读取账本
+
+    Returns:
+        {"series": {key: {"cursor": {...}, "days": {...}}}}，不存在时返回空结构
+    """
+    ledger = load_json(LEDGER_FILE) if path.exists(LEDGER_FILE) else None
+    if not isinstance(ledger, dict):
+        ledger = {}
+    ledger.setdefault("series", {})
+    # 旧版账本的 readings 字段在开启重复读数压缩时增量与全量结果不一致，已移除
+    for entry in ledger["series"].values():
+        for day in (entry.get("days") or {}).values():
+            day.pop("readings", None)
+    return ledger
+
+
+def list_series() -> List[Tuple[str, str, Optional[str]]]:
+    """
+    列出所有数据序列
+
+    Returns:
+        [(账本键, 记录字段, 房间号)]，默认布局的房间号为 None
+    """
+    series = []
+    if list_month_files():
+        for key, field in PAIR_FIELDS.items():
+            series.append((key, field, None))
+    for room in load_room_index()["rooms"]:
+        series.append((room, "balance", room))
+    return series
+
+
+def iter_readings(
+    room: Optional[str], field: str, cursor: Optional[Dict] = None
+) -> Iterator[Tuple[str, str, float]]:
+    """
+    按时间顺序遍历游标之后的读数
+
+    Args:
+        room: 房间号，默认布局为 None
+        field: 余额字段
+        cursor: 上次处理到的位置 {"month", "time"}
+
+    Yields:
+        (月份, 记录时间, 余额)
+    """
+    since = parse_record_time(cursor["time"], cursor["month"]) if cursor else None
+    for recorded_at, record in iter_records(room, start=since):
+        balance = record.get(field)
+        if balance is None or (since and recorded_at <= since):
+            continue
+        yield month_key(recorded_at), record["time"], balance
+
+
+def classify(
+    previous: Dict, month: str, time_str: str, balance: float
+) -> Tuple[str, float, float]:
+    """
+    分类一次余额变化
+
+    Args:
+        previous: 上一读数 {"month", "time", "balance"}
+        month: 当前读数所在月份
+        time_str: 当前读数时间
+        balance: 当前余额
+
+    Returns:
+        (类别, 变化量, 间隔小时数)；consumption 与 topup 的变化量为正数，gap 为带符号的净变化
+    """
+    started = parse_record_time(previous["time"], previous["month"])
+    current = parse_record_time(time_str, month)
+    hours = (current - started).total_seconds() / 3600 if started and current else 0.0
+    delta = round(balance - previous["balance"], 4)
+
+    if hours > LEDGER_GAP_HOURS:
+        return "gap", delta, hours
+    if delta > 0:
+        return "topup", delta, hours
+    return "consumption", -delta, hours
+
+
+def _empty_day() -> Dict:
+    return {"consumption": 0.0, "topup": 0.0, "gap": 0.0, "gap_hours": 0.0}
+
+
+def update_series(entry: Dict, room: Optional[str], field: str) -> int:
+    """
+    处理一个序列的新增读数，原地更新账本条目
+
+    Args:
+        entry: 账本中的序列 {"cursor": ..., "days": ...}
+        room: 房间号，默认布局为 None
+        field: 余额字段
+
+    Returns:
+        处理的读数数量
+    """
+    days = entry.setdefault("days", {})
+    cursor = entry.get("cursor")
+    count = 0
+
+    for month, time_str, balance in iter_readings(room, field, cursor):
+        day_key = f"{month[:4]}-{time_str[:5]}"
+        day = days.setdefault(day_key, _empty_day())
+
+        if cursor:
+            kind, amount, hours = classify(cursor, month, time_str, balance)
+            day[kind] = round(day[kind] + amount, 4)
+            if kind == "gap":
+                day["gap_hours"] = round(day["gap_hours"] + hours, 2)
+
+        cursor = {"month": month, "time": time_str, "balance": balance}
+        count += 1
+
+    entry["cursor"] = cursor
+    return count
+
+
+@locked
+def update_ledger() -> Dict:
+    """
+    增量更新账本：每个序列只处理游标之后的读数（首次运行处理全部历史）
+
+    Returns:
+        更新后的账本
+    """
+    ledger = load_ledger()
+    processed = 0
+    for key, field, room in list_series():
+        entry = ledger["series"].setdefault(key, {})
+        processed += update_series(entry, room, field)
+
+    if processed:
+        ledger["updated_at"] = get_cst_time()
+        save_json(ledger, LEDGER_FILE)
+        logger.info(f"账本已更新，新增 {processed} 条读数")
+    return ledger
+
+
+def daily_totals(ledger: Dict, key: str) -> Dict[str, Dict]:
+    """
+    获取某个序列的按天汇总
+
+    Args:
+        ledger: 账本
+        key: 序列键（"light" / "ac" / 房间号）
+
+    Returns:
+        {日期: {"consumption", "topup", "gap", "gap_hours"}}
+    """
+    return ledger["series"].get(key, {}).get("days", {})
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    result = update_ledger()
+    for series_key, series_entry in result["series"].items():
+        series_days = series_entry.get("days", {})
+        total = {name: round(sum(d[name] for d in series_days.values()), 2) for name in DAY_FIELDS}
+        print(f"{series_key}: {len(series_days)} 天, {total}")
@@ -3,19 +3,37 @@ ZZU 宿舍电量监控 - 主入口
 
 功能:
 1. 获取宿舍电量信息
-2. 记录电量数据
-3. 发送通知
+2. 将结果并发发布给各输出端（记录数据、发送通知、更新指标等，见 pipeline.py）
+
+用法:
+    python main.py           # 轮询一次（设置 POLL_INTERVAL 时为常驻模式）
+    python main.py --cached  # 输出当前余额，最新读数足够新时不发起网络请求
 """
+import json
 import logging
 import os
 import sys
 import threading
 import time
+from typing import TYPE_CHECKING, Optional
+
+from config import (
+    LIGHT_ROOM, AC_ROOM, ROOMS, RUN_REPORT_FILE,
+    METRICS_TEXTFILE, METRICS_PORT, POLL_INTERVAL, CHANGES_FILE, GITHUB_OUTPUT_FILE,
+    STEP_SUMMARY_FILE, PUBLISH_HEARTBEAT,
+)
+import metrics
+from pipeline import REFRESH_SINKS, REQUIRED_SINKS, SINKS, PollResult, load_plugin_sinks, publish
+from storage import (
+    recover_data_files, get_latest_record, get_changed_files, reset_changed_files, load_latest,
+)
+from timeutil import parse_record_time, record_timestamp
+from timing import budget, report, span
 
-from config import ACCOUNT, PASSWORD, LIGHT_ROOM, AC_ROOM
-from monitor import EnergyMonitor
-from storage import record_energy_data, update_time_list, update_last_records
-from notify import notify
+# monitor（zzupy、tenacity）与 notify（requests 及各通知渠道）较重，
+# 在确认环境变量完整、真正需要时再导入，以加快启动与配置错误时的失败速度
+if TYPE_CHECKING:
+    from monitor import EnergyMonitor
 
 # 配置日志
 logging.basicConfig(
@@ -25,58 +43,244 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_cst_time_str(format_str: str) -> str:
-    """获取中国标准时间字符串"""
-    import pytz
-    from datetime import datetime
+def seed_metrics(rooms: list[str]) -> None:
+    """用已存储的最新记录初始化上一次读数，使单次运行也能计算消耗速率"""
+    if rooms:
+        for room in rooms:
+            record = get_latest_record(room)
+            recorded_at = parse_record_time(record["time"]) if record else None
+            if recorded_at:
+                metrics.observe_balance(room, "room", record["balance"], recorded_at.timestamp())
+        return
 
-    cst_tz = pytz.timezone("Asia/Shanghai")
-    return datetime.now(cst_tz).strftime(format_str)
+    record = get_latest_record()
+    recorded_at = parse_record_time(record["time"]) if record else None
+    if recorded_at:
+        timestamp = recorded_at.timestamp()
+        metrics.observe_balance(LIGHT_ROOM, "light", record["light_Balance"], timestamp)
+        metrics.observe_balance(AC_ROOM, "ac", record["ac_Balance"], timestamp)
 
 
-def main():
-    """主函数"""
-    logger.info("启动宿舍电量监控程序...")
+def fetch_rooms(monitor: "EnergyMonitor", rooms: list[str]) -> Optional[PollResult]:
+    """整栋楼模式：一次登录轮询所有房间"""
+    try:
+        with span("stage.fetch"):
+            balances = monitor.get_room_balances(rooms)
+    except Exception as e:
+        logger.error(f"获取电量失败: {e}")
+        return None
 
-    # 检查必要的环境变量
-    required_env_vars = ["ACCOUNT", "PASSWORD", "LIGHT_ROOM", "AC_ROOM"]
-    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-    if missing_vars:
-        logger.error(f"缺少必要的环境变量: {', '.join(missing_vars)}")
-        sys.exit(1)
+    if not balances:
+        logger.error("所有房间获取电量失败")
+        return None
 
-    # 获取电量信息
-    monitor = EnergyMonitor()
+    return PollResult(time=record_timestamp(), balances=balances, rooms=True)
+
+
+def fetch_pair(monitor: "EnergyMonitor") -> Optional[PollResult]:
+    """默认模式：照明 + 空调两个房间"""
     try:
-        balances = monitor.get_balance()
+        with span("stage.fetch"):
+            balances = monitor.get_balance()
     except Exception as e:
         logger.error(f"获取电量失败: {e}")
-        sys.exit(1)
+        return None
 
     logger.info(
         f"照明剩余电量: {balances['light_Balance']} 度, "
         f"空调剩余电量: {balances['ac_Balance']} 度"
     )
+    return PollResult(time=record_timestamp(), balances=balances)
+
+
+def poll_once(monitor: "EnergyMonitor", rooms: list[str]) -> bool:
+    """执行一轮轮询，记录运行结果指标"""
+    budget.reset()
+    result = fetch_rooms(monitor, rooms) if rooms else fetch_pair(monitor)
+    success = False
+    if result:
+        # 存储、通知、指标等输出端并发执行，互不阻塞
+        outcomes = publish(result)
+        failed = [name for name, ok in outcomes.items() if not ok]
+        if failed:
+            logger.error(f"输出端失败: {', '.join(failed)}")
+        # 读数已写入即视为成功，通知、账本等输出端失败不阻止发布
+        success = all(outcomes.get(name, True) for name in REQUIRED_SINKS)
+        # 全部输出端已结束，关闭本轮复用的 SMTP 连接（进程以 os._exit 退出，atexit 不会执行）
+        if "notify" in sys.modules:
+            from notify import close_email_transport
+            close_email_transport()
+    report_skipped()
+    metrics.observe_run(success)
+    if METRICS_TEXTFILE:
+        metrics.write_textfile(METRICS_TEXTFILE)
+    return success
+
+
+def refresh_balances(monitor: "EnergyMonitor", rooms: list[str]) -> bool:
+    """余额缓存的刷新：只获取并写入读数，不发送通知、不检测异常"""
+    budget.reset()
+    result = fetch_rooms(monitor, rooms) if rooms else fetch_pair(monitor)
+    if not result:
+        return False
+    outcomes = publish(result, {name: SINKS[name] for name in REFRESH_SINKS if name in SINKS})
+    return all(outcomes.get(name, True) for name in REQUIRED_SINKS)
+
+
+def report_skipped() -> None:
+    """将因时间预算跳过的操作写入 GitHub Actions 运行摘要"""
+    if not budget.skipped or not STEP_SUMMARY_FILE:
+        return
+    lines = "\n".join(f"- `{name}`" for name in budget.skipped)
+    with open(STEP_SUMMARY_FILE, "a", encoding="utf-8") as f:
+        f.write(f"\n### ⏱️ 因时间预算跳过\n\n{lines}\n")
+
+
+def is_repeat_reading(before: dict, after: dict) -> bool:
+    """
+    本次读数是否与上次的读数相同，无需重新发布
+
+    Args:
+        before: 轮询前的 latest.json（工作流中即上次发布的内容）
+        after: 轮询后的 latest.json
+
+    Returns:
+        所有序列的余额都未变化，且上次读数距今不超过 PUBLISH_HEARTBEAT 分钟
+    """
+    if not after["rooms"] or before["rooms"].keys() != after["rooms"].keys():
+        return False
 
-    # 发送通知
-    notify(balances)
+    now = time.time()
+    for key, entry in after["rooms"].items():
+        previous = before["rooms"][key]
+        if entry.get("balance") != previous.get("balance"):
+            return False
+        recorded_at = parse_record_time(previous.get("time") or "")
+        if recorded_at is None or now - recorded_at.timestamp() >= PUBLISH_HEARTBEAT * 60:
+            return False
+    return True
 
-    # 记录数据
-    latest_record = {
-        "time": get_cst_time_str("%m-%d %H:%M:%S"),
-        "light_Balance": balances["light_Balance"],
-        "ac_Balance": balances["ac_Balance"],
-    }
 
-    record_energy_data(latest_record)
-    update_time_list()
-    update_last_records()
+def report_changes(repeat: bool = False) -> list[str]:
+    """
+    输出本次运行需要发布的文件，供工作流判断是否需要发布
 
-    logger.info("程序运行结束")
+    每次成功读数都会更新月份文件与 latest.json 中的读数时间；读数与上次相同时（repeat）
+    这些变化只保留在本地，不触发发布，直到余额变化或超过 PUBLISH_HEARTBEAT。
+
+    Args:
+        repeat: 本次读数是否与上次相同（见 is_repeat_reading）
+
+    Returns:
+        需要发布的变化文件列表
+    """
+    changed = get_changed_files()
+    if changed and repeat:
+        logger.info(f"读数与上次相同，跳过发布（本地已更新: {', '.join(changed)}）")
+        changed = []
+    elif changed:
+        logger.info(f"本次变化的文件: {', '.join(changed)}")
+    else:
+        logger.info("数据无变化")
+
+    if CHANGES_FILE:
+        with open(CHANGES_FILE, "w", encoding="utf-8") as f:
+            f.writelines(f"{file_path}\n" for file_path in changed)
+    if GITHUB_OUTPUT_FILE:
+        with open(GITHUB_OUTPUT_FILE, "a", encoding="utf-8") as f:
+            f.write(f"changes={'true' if changed else 'false'}\n")
+    return changed
+
+
+def main():
+    """主函数"""
+    logger.info("启动宿舍电量监控程序...")
+
+    # 检查必要的环境变量（配置 ROOMS 时为整栋楼模式，无需 LIGHT_ROOM/AC_ROOM）
+    required_env_vars = ["ACCOUNT", "PASSWORD"]
+    if not ROOMS:
+        required_env_vars += ["LIGHT_ROOM", "AC_ROOM"]
+    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+    if missing_vars:
+        logger.error(f"缺少必要的环境变量: {', '.join(missing_vars)}")
+        sys.exit(1)
+
+    # 修复上次运行被中断时可能留下的截断文件
+    repaired = recover_data_files()
+    if repaired:
+        logger.warning(f"已修复数据文件: {', '.join(repaired)}")
+
+    rooms = [room.strip() for room in (ROOMS or "").split(",") if room.strip()]
+    if rooms:
+        logger.info(f"整栋楼模式，共 {len(rooms)} 个房间")
+
+    from balance_cache import BalanceCache
+    from monitor import EnergyMonitor
+
+    plugins = load_plugin_sinks()
+    if plugins:
+        logger.info(f"已加载输出端: {', '.join(plugins)}")
+
+    seed_metrics(rooms)
+
+    # 监控器（CAS 客户端）在第一次真正需要查询时才创建
+    monitors: list["EnergyMonitor"] = []
+
+    def get_monitor() -> "EnergyMonitor":
+        if not monitors:
+            monitors.append(EnergyMonitor())
+        return monitors[0]
+
+    def poll() -> bool:
+        return poll_once(get_monitor(), rooms)
+
+    cache = BalanceCache(lambda: refresh_balances(get_monitor(), rooms))
+
+    if "--cached" in sys.argv[1:]:
+        before = load_latest()
+        balances = cache.get()
+        print(json.dumps({key: b.to_dict() for key, b in balances.items()}, ensure_ascii=False, indent=2))
+        # 读数已过期时先输出旧值，退出前等待后台刷新写完
+        cache.wait_revalidation()
+        report_changes(is_repeat_reading(before, load_latest()))
+        if not balances:
+            sys.exit(1)
+        return
+
+    if POLL_INTERVAL <= 0:
+        before = load_latest()
+        success = poll()
+        report_changes(is_repeat_reading(before, load_latest()))
+        if not success:
+            sys.exit(1)
+        logger.info("程序运行结束")
+        return
+
+    # 常驻模式：定时轮询，可选暴露 /metrics 与 /balance 端点
+    if METRICS_PORT:
+        def balance_route() -> tuple[str, bytes]:
+            balances = {key: b.to_dict() for key, b in cache.get().items()}
+            return "application/json; charset=utf-8", json.dumps(balances, ensure_ascii=False).encode("utf-8")
+
+        metrics.start_http_server(METRICS_PORT, routes={"/balance": balance_route})
+    logger.info(f"常驻模式，轮询间隔 {POLL_INTERVAL} 秒")
+    while True:
+        started = time.monotonic()
+        reset_changed_files()
+        before = load_latest()
+        # 与 /balance 触发的刷新共用同一把锁，不会同时登录两次
+        cache.refresh_now(poll)
+        report_changes(is_repeat_reading(before, load_latest()))
+        report.emit(RUN_REPORT_FILE)
+        report.reset()
+        time.sleep(max(0.0, POLL_INTERVAL - (time.monotonic() - started)))
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        report.emit(RUN_REPORT_FILE)
 
     # 打印存活线程，辅助调试
     for t in threading.enumerate():
@@ -1,29 +1,117 @@
+"""
+Markdown 状态渲染
+
+从 latest.json（各房间的当前状态）渲染状态表，不读取历史数据。
+表格只包含余额变化相关的内容，读数未变化时输出与上次相同，避免无意义的提交。
+"""
 import json
+from typing import Optional
+
+from config import LATEST_FILE
+
+# 默认模式的房间键
+ROOM_LABELS = {"light": "照明", "ac": "空调"}
+
+# 余额变化的趋势箭头
+TREND_UP = "↑"
+TREND_DOWN = "↓"
+TREND_FLAT = "→"
 
-def load_data_from_json(file_path: str) -> list[dict] | None:
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return []  # 如果文件不存在，返回空列表
-    except json.JSONDecodeError:
-        return []  # 如果文件内容无法解析为 JSON，返回空列表
-        
 MD_TEMPLATE = '''
 ## Balance Record
-| **剩余电费** | **照明房间** | **空调房间** |
-| --------------- | -------------------- | -------------- |
-| {time}  |    {light_Balance}      |    {ac_Balance} |
+| **房间** | **剩余电量** | **趋势** | **预计用完** | **最近变化** |
+| -------- | ------------ | -------- | ------------ | ------------ |
+{rows}
 '''
 
-if __name__ == "__main__":
-    # 获取最新记录
-    latest_record = load_data_from_json("./page/data/last_30_records.json")[-1]
 
-    # 从最新记录提取数据
-    time = latest_record["time"]
-    light_balance = latest_record["light_Balance"]
-    ac_balance = latest_record["ac_Balance"]
+def load_data_from_json(file_path: str) -> dict:
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}  # 文件不存在或无法解析时返回空数据
+    return data if isinstance(data, dict) else {}
+
+
+def get_trend(entry: dict) -> str:
+    """余额相对上一次变化的趋势箭头"""
+    previous = entry.get("previous")
+    if previous is None:
+        return TREND_FLAT
+    if entry["balance"] > previous:
+        return TREND_UP
+    if entry["balance"] < previous:
+        return TREND_DOWN
+    return TREND_FLAT
+
+
+def format_time_to_empty(balance: float, rate: Optional[float]) -> str:
+    """
+    按消耗速率估算余额用完的时间
+
+    Args:
+        balance: 当前余额（度）
+        rate: 消耗速率（度/小时）
 
-    # 格式化 Markdown 模板并打印
-    print(MD_TEMPLATE.format(time=time, light_Balance=light_balance, ac_Balance=ac_balance))
+    Returns:
+        如 "约 3 天 4 小时"，无法估算时返回 "-"
+    """
+    if balance <= 0:
+        return "已用完"
+    if not rate or rate <= 0:
+        return "-"
+    hours = int(balance / rate)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"约 {days} 天 {hours} 小时"
+    return f"约 {hours} 小时" if hours else "不足 1 小时"
+
+
+def render_latest(latest: dict) -> str:
+    """
+    渲染多房间状态表
+
+    Args:
+        latest: latest.json 内容
+
+    Returns:
+        Markdown 文本，无数据时返回提示
+    """
+    rooms = latest.get("rooms") or {}
+    if not rooms:
+        return "\n## Balance Record\n\n暂无数据\n"
+
+    rows = []
+    order = list(ROOM_LABELS)
+    for key in sorted(rooms, key=lambda k: (order.index(k) if k in order else len(order), k)):
+        entry = rooms[key]
+        rows.append(
+            f"| {ROOM_LABELS.get(key, key)} | {entry['balance']} | {get_trend(entry)} "
+            f"| {format_time_to_empty(entry['balance'], entry.get('rate'))} "
+            f"| {entry.get('changed_at') or '-'} |"
+        )
+    return MD_TEMPLATE.format(rows="\n".join(rows))
+
+
+def write_if_changed(file_path: str, content: str) -> bool:
+    """
+    内容变化时才写入文件
+
+    Args:
+        file_path: 输出路径
+        content: 文本内容
+
+    Returns:
+        是否写入
+    """
+    from storage import atomic_write, data_lock
+
+    # atomic_write 按内容摘要跳过相同内容的写入；与其他写入者一样持有数据目录锁，
+    # 避免并发的 recover_data_files 清理掉写入中的临时文件
+    with data_lock():
+        return atomic_write(file_path, content.encode("utf-8"), backup=False)
+
+
+if __name__ == "__main__":
+    print(render_latest(load_data_from_json(LATEST_FILE)))
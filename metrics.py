@@ -0,0 +1,314 @@
+"""
+Prometheus 指标模块
+
+提供电量余额、消耗速率、轮询延迟、登录与通知结果等指标，支持两种输出方式:
+- 单次运行: 写入 node_exporter textfile collector 目录
+- 常驻运行: 内置 HTTP 端点 /metrics
+
+仅依赖标准库，输出 Prometheus 文本格式 (0.0.4)。
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from timing import report
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 延迟直方图分桶（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """可任意设置的数值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def get(self, **labels) -> Optional[float]:
+        with self._lock:
+            return self._values.get(_label_key(labels))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelKey, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+# ==================== 指标定义 ====================
+
+BALANCE = Gauge(
+    "zzu_room_balance_kwh", "Remaining electricity balance of a room in kWh"
+)
+CONSUMPTION_RATE = Gauge(
+    "zzu_room_consumption_rate_kwh_per_hour",
+    "Consumption rate between the two latest readings in kWh per hour",
+)
+LAST_READING = Gauge(
+    "zzu_room_last_reading_timestamp_seconds", "Unix time of the latest reading of a room"
+)
+POLL_LATENCY = Histogram(
+    "zzu_poll_latency_seconds", "Latency of polling stages (login, balance queries)"
+)
+LOGINS = Counter(
+    "zzu_logins_total", "CAS/ECard login attempts by method and result"
+)
+TOKEN_REUSE = Counter(
+    "zzu_token_reuse_total", "Runs that logged in with a saved token instead of the password"
+)
+NOTIFICATIONS = Counter(
+    "zzu_notifications_total", "Notification deliveries by channel and result"
+)
+HEDGES = Counter(
+    "zzu_hedged_requests_total",
+    "Hedged ECard queries by endpoint and outcome (won: the duplicate answered first)",
+)
+RUN_SUCCESS = Gauge(
+    "zzu_last_run_success", "Whether the latest poll cycle succeeded (1) or failed (0)"
+)
+RUN_TIMESTAMP = Gauge(
+    "zzu_last_run_timestamp_seconds", "Unix time at which the latest poll cycle finished"
+)
+
+# 上一次读数，用于计算消耗速率: (room, kind) -> (timestamp, balance)
+_previous: Dict[Tuple[str, str], Tuple[float, float]] = {}
+_previous_lock = threading.Lock()
+
+
+def observe_balance(
+    room: str, kind: str, balance: float, timestamp: Optional[float] = None
+) -> None:
+    """
+    记录一次电量读数，并根据上一次读数更新消耗速率
+
+    Args:
+        room: 房间号
+        kind: 类型 (light/ac/room)
+        balance: 剩余电量
+        timestamp: 读数时间（Unix 时间，默认当前）
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    BALANCE.set(balance, room=room, kind=kind)
+    LAST_READING.set(timestamp, room=room, kind=kind)
+
+    with _previous_lock:
+        previous = _previous.get((room, kind))
+        _previous[(room, kind)] = (timestamp, balance)
+
+    if previous and timestamp > previous[0]:
+        hours = (timestamp - previous[0]) / 3600
+        CONSUMPTION_RATE.set((previous[1] - balance) / hours, room=room, kind=kind)
+
+
+# 计入轮询延迟直方图的阶段
+POLL_STAGES = {"cas.login", "ecard.login", "ecard.get_remaining_energy", "stage.fetch"}
+
+
+def observe_span(entry: Dict) -> None:
+    """timing 阶段结束回调：将轮询相关阶段的耗时计入直方图"""
+    if entry["name"] in POLL_STAGES and entry["status"] != "wait":
+        POLL_LATENCY.observe(entry["duration"], stage=entry["name"])
+
+
+report.add_listener(observe_span)
+
+
+def observe_run(success: bool) -> None:
+    """记录一轮轮询的结果"""
+    RUN_SUCCESS.set(1 if success else 0)
+    RUN_TIMESTAMP.set(time.time())
+
+
+def render() -> str:
+    """生成 Prometheus 文本格式的全部指标"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def write_textfile(file_path: str) -> bool:
+    """
+    写入 textfile collector 文件（原子替换，避免采集到半个文件）
+
+    Args:
+        file_path: 输出路径，应以 .prom 结尾
+
+    Returns:
+        是否成功
+    """
+    try:
+        dir_path = os.path.dirname(file_path) or "."
+        os.makedirs(dir_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=".metrics.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # mkstemp 创建的文件为 0600，node_exporter 通常以其他用户运行，需可读
+            if hasattr(os, "fchmod"):
+                os.fchmod(f.fileno(), 0o644)
+            f.write(render())
+        os.replace(tmp_path, file_path)
+        logger.info(f"指标已写入: {file_path}")
+        return True
+    except OSError as e:
+        logger.error(f"写入指标文件失败: {e}")
+        return False
+
+
+def start_http_server(
+    port: int, addr: str = "0.0.0.0",
+    routes: Optional[Dict[str, Callable[[], Tuple[str, bytes]]]] = None,
+):
+    """
+    在后台线程启动 /metrics HTTP 端点
+
+    Args:
+        port: 监听端口
+        addr: 监听地址
+        routes: 额外的路径 -> 处理函数，处理函数返回 (Content-Type, 响应体)
+
+    Returns:
+        HTTP 服务器实例
+    """
+    routes = dict(routes or {})
+    # 仅常驻模式需要，延迟导入以加快单次运行的启动
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """/metrics HTTP 处理器"""
+
+        def do_GET(self):
+            route = self.path.split("?")[0]
+            if route in routes:
+                try:
+                    content_type, body = routes[route]()
+                except Exception as e:
+                    logger.error(f"处理 {route} 失败: {e}")
+                    self.send_error(500)
+                    return
+            elif route in ("/metrics", "/"):
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+                body = render().encode("utf-8")
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"metrics: {format % args}")
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"指标端点已启动: http://{addr}:{port}/metrics")
+    return server
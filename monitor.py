@@ -5,8 +5,8 @@
 """
 import json
 import logging
-from os import makedirs, path
-from typing import Dict, Optional
+from os import path
+from typing import Dict, List, Optional
 
 from tenacity import (
     retry,
@@ -16,14 +16,16 @@ from tenacity import (
     wait_fixed,
     retry_if_exception_type,
 )
-from zzupy.app import CASClient, ECardClient
 
 from config import (
     ACCOUNT, PASSWORD, LIGHT_ROOM, AC_ROOM,
-    TOKEN_FILE, DATA_DIR,
+    TOKEN_FILE, ECARD_HEDGE,
     RETRY_ATTEMPTS, RETRY_MULTIPLIER, INITIAL_WAIT, MAX_WAIT,
 )
-from storage import get_cst_time
+import metrics
+from storage import atomic_write, data_lock
+from timeutil import get_cst_time
+from timing import budget, record_retry_wait, span, stop_on_budget, timed
 
 logger = logging.getLogger(__name__)
 
@@ -46,10 +48,12 @@ def create_retry_decorator(stop_attempts: int = RETRY_ATTEMPTS, wait_strategy=No
             max=MAX_WAIT
         )
 
+    # 重试等待从本次运行的共享预算中扣除，超出截止时间时提前停止
     return retry(
-        stop=stop_after_attempt(stop_attempts),
+        stop=stop_after_attempt(stop_attempts) | stop_on_budget,
         wait=wait_strategy,
         retry=retry_if_exception_type(Exception),
+        before_sleep=record_retry_wait,
         reraise=True
     )
 
@@ -68,21 +72,22 @@ class TokenManager:
     """Token 管理器"""
 
     @staticmethod
+    @timed("token.save")
     def save(user_token: str, refresh_token: str) -> None:
         """保存 token 到文件"""
         try:
-            token_data = {
-                "user_token": user_token,
-                "refresh_token": refresh_token,
-                "saved_at": get_cst_time()
-            }
-
-            dir_path = path.dirname(TOKEN_FILE)
-            if dir_path and not path.exists(dir_path):
-                makedirs(dir_path, exist_ok=True)
-
-            with open(TOKEN_FILE, "w", encoding="utf-8") as f:
-                json.dump(token_data, f, ensure_ascii=False, indent=2)
+            with data_lock():
+                # 保留同一文件中的其他字段（如通知渠道凭证 providers）
+                token_data = TokenManager.load(quiet=True) or {}
+                token_data.update({
+                    "user_token": user_token,
+                    "refresh_token": refresh_token,
+                    "saved_at": get_cst_time()
+                })
+
+                # 原子写入；Token 为明文，不保留滚动备份
+                content = json.dumps(token_data, ensure_ascii=False, indent=2)
+                atomic_write(TOKEN_FILE, content.encode("utf-8"), backup=False, private=True)
 
             logger.info(f"Token 已保存: {TOKEN_FILE}")
         except Exception as e:
@@ -90,17 +95,20 @@ class TokenManager:
             raise
 
     @staticmethod
-    def load() -> Optional[Dict[str, str]]:
-        """从文件加载 token"""
+    @timed("token.load")
+    def load(quiet: bool = False) -> Optional[Dict[str, str]]:
+        """从文件加载 token（quiet 时不输出日志）"""
         try:
             if not path.exists(TOKEN_FILE):
-                logger.info("Token 文件不存在，将使用账号密码登录")
+                if not quiet:
+                    logger.info("Token 文件不存在，将使用账号密码登录")
                 return None
 
             with open(TOKEN_FILE, "r", encoding="utf-8") as f:
                 token_data = json.load(f)
 
-            logger.info(f"Token 加载成功，保存时间: {token_data.get('saved_at', '未知')}")
+            if not quiet:
+                logger.info(f"Token 加载成功，保存时间: {token_data.get('saved_at', '未知')}")
             return token_data
 
         except (FileNotFoundError, json.JSONDecodeError) as e:
@@ -111,9 +119,26 @@ class TokenManager:
 class EnergyMonitor:
     """电量监控器"""
 
-    def __init__(self):
-        self.cas_client = CASClient(ACCOUNT, PASSWORD)
-        self.get_balance = create_retry_decorator()(self._get_balance)
+    def __init__(self, cas_client_cls=None, ecard_client_cls=None, wait_strategy=None):
+        """
+        Args:
+            cas_client_cls: CAS 客户端类，默认 zzupy.app.CASClient（离线基准测试可替换）
+            ecard_client_cls: 一卡通客户端类，默认 zzupy.app.ECardClient
+            wait_strategy: 重试等待策略，默认指数退避
+        """
+        if cas_client_cls is None or ecard_client_cls is None:
+            from zzupy.app import CASClient, ECardClient
+            cas_client_cls = cas_client_cls or CASClient
+            ecard_client_cls = ecard_client_cls or ECardClient
+
+        self.ecard_client_cls = ecard_client_cls
+        self.cas_client = cas_client_cls(ACCOUNT, PASSWORD)
+        self.get_balance = create_retry_decorator(
+            wait_strategy=wait_strategy
+        )(self._get_balance)
+        self.get_room_balances = create_retry_decorator(
+            wait_strategy=wait_strategy
+        )(self._get_room_balances)
 
     def _init_cas_client(self) -> bool:
         """初始化 CAS 客户端"""
@@ -127,22 +152,33 @@ class EnergyMonitor:
                     token_data["user_token"],
                     token_data["refresh_token"]
                 )
-                self.cas_client.login()
+                with span("cas.login", method="token"):
+                    self.cas_client.login()
 
                 if self.cas_client.logged_in:
                     logger.info("Token 登录成功")
+                    metrics.LOGINS.inc(method="token", result="success")
+                    metrics.TOKEN_REUSE.inc()
                     return True
                 else:
                     logger.warning("Token 已失效，将使用账号密码登录")
+                    metrics.LOGINS.inc(method="token", result="failure")
             except Exception as e:
                 logger.warning(f"Token 登录失败: {e}")
+                metrics.LOGINS.inc(method="token", result="failure")
 
         # 使用账号密码登录
         logger.info("使用账号密码进行 CAS 认证...")
-        self.cas_client.login()
+        try:
+            with span("cas.login", method="password"):
+                self.cas_client.login()
+        except Exception:
+            metrics.LOGINS.inc(method="password", result="failure")
+            raise
 
         if self.cas_client.logged_in:
             logger.info("CAS 认证成功")
+            metrics.LOGINS.inc(method="password", result="success")
             try:
                 TokenManager.save(
                     self.cas_client.user_token,
@@ -153,21 +189,58 @@ class EnergyMonitor:
             return True
         else:
             logger.error("CAS 认证失败")
+            metrics.LOGINS.inc(method="password", result="failure")
             return False
 
+    @staticmethod
+    def _login_ecard(ecard) -> None:
+        """登录一卡通，记录登录结果"""
+        try:
+            with span("ecard.login"):
+                ecard.login()
+        except Exception:
+            metrics.LOGINS.inc(method="ecard", result="failure")
+            raise
+        metrics.LOGINS.inc(method="ecard", result="success")
+
+    @staticmethod
+    def _query_energy(ecard, room: str) -> float:
+        """查询一个房间的剩余电量，开启 ECARD_HEDGE 时对慢请求发出对冲请求"""
+        with span("ecard.get_remaining_energy", room=room):
+            if ECARD_HEDGE:
+                from hedge import hedged_call
+                return hedged_call("ecard.get_remaining_energy", ecard.get_remaining_energy, room=room)
+            return ecard.get_remaining_energy(room=room)
+
+    @staticmethod
+    def _finish_hedges() -> None:
+        """等待落后的对冲请求结束并保存接口延迟直方图（仅对冲模式，须在关闭一卡通客户端之前调用）"""
+        if not ECARD_HEDGE:
+            return
+        from hedge import latency_tracker, wait_stragglers
+        remaining = budget.remaining()
+        wait_stragglers(None if remaining == float("inf") else max(0.0, remaining))
+        try:
+            latency_tracker.save()
+        except Exception as e:
+            logger.warning(f"保存延迟统计失败: {e}")
+
     def _get_balance(self) -> Dict[str, float]:
         """获取电量余额"""
         if not self._init_cas_client():
             raise Exception("CAS 认证失败，无法获取电量信息")
 
         logger.info("创建一卡通客户端...")
-        with ECardClient(self.cas_client) as ecard:
-            ecard.login()
+        with self.ecard_client_cls(self.cas_client) as ecard:
+            self._login_ecard(ecard)
             logger.info("一卡通登录成功")
 
             logger.info("获取电量余额...")
-            light_balance = ecard.get_remaining_energy(room=LIGHT_ROOM)
-            ac_balance = ecard.get_remaining_energy(room=AC_ROOM)
+            try:
+                light_balance = self._query_energy(ecard, LIGHT_ROOM)
+                ac_balance = self._query_energy(ecard, AC_ROOM)
+            finally:
+                self._finish_hedges()
 
             logger.info(f"照明: {light_balance} 度, 空调: {ac_balance} 度")
 
@@ -175,3 +248,41 @@ class EnergyMonitor:
                 "light_Balance": light_balance,
                 "ac_Balance": ac_balance
             }
+
+    def _get_room_balances(self, rooms: List[str]) -> Dict[str, float]:
+        """
+        获取多个房间的电量余额（整栋楼模式）
+
+        只登录一次；单个房间查询失败不影响其他房间。
+        所有房间都失败时（如一卡通会话失效）抛出异常，交由重试装饰器重新登录。
+
+        Args:
+            rooms: 房间号列表
+
+        Returns:
+            房间号 -> 剩余电量
+        """
+        if not self._init_cas_client():
+            raise Exception("CAS 认证失败，无法获取电量信息")
+
+        balances = {}
+        last_error: Optional[Exception] = None
+        with self.ecard_client_cls(self.cas_client) as ecard:
+            self._login_ecard(ecard)
+            logger.info("一卡通登录成功")
+
+            try:
+                for room in rooms:
+                    try:
+                        balances[room] = self._query_energy(ecard, room)
+                    except Exception as e:
+                        logger.warning(f"房间 {room} 获取电量失败: {e}")
+                        last_error = e
+            finally:
+                self._finish_hedges()
+
+        if rooms and not balances:
+            raise Exception(f"所有房间获取电量失败: {last_error}") from last_error
+
+        logger.info(f"已获取 {len(balances)}/{len(rooms)} 个房间的电量")
+        return balances
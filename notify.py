@@ -3,13 +3,14 @@
 
 通知逻辑:
 - Telegram: 每次运行都发送
-- 其他渠道: 仅在电量低于阈值时发送
+- 其他渠道: 仅在电量低于阈值或用电异常时发送
 """
 import json
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from typing import Dict, Optional, Callable
+import threading
+import time
+from os import path
+from typing import Dict, List, Optional, Callable, Tuple
 from urllib.parse import urlencode
 
 import requests
@@ -26,13 +27,20 @@ from config import (
     THRESHOLD,
     EXCELLENT_THRESHOLD,
     RETRY_ATTEMPTS,
+    TOKEN_FILE,
+    TOKEN_REFRESH_MARGIN,
     # 通知渠道配置
     TELEGRAM_BOT_TOKEN,
     TELEGRAM_CHAT_ID,
+    TELEGRAM_API_URL,
     SERVERCHAN_KEYS,
+    SERVERCHAN_API_URL,
     EMAIL,
     SMTP_CODE,
     SMTP_SERVER,
+    SMTP_PORT,
+    SMTP_SSL,
+    EMAIL_TO,
     BARK_URL,
     BARK_KEY,
     DINGTALK_WEBHOOK,
@@ -45,19 +53,26 @@ from config import (
     GOTIFY_URL,
     GOTIFY_TOKEN,
     IGOT_KEY,
+    IGOT_API_URL,
     PUSHDEER_KEY,
+    PUSHDEER_API_URL,
     SYNOLOGY_CHAT_URL,
     SYNOLOGY_CHAT_TOKEN,
     PUSHPLUS_TOKEN,
+    PUSHPLUS_API_URL,
     WECOM_CORP_ID,
     WECOM_AGENT_ID,
     WECOM_SECRET,
     WECOM_TOUSER,
+    WECOM_API_URL,
     QMSG_KEY,
     QMSG_QQ,
+    QMSG_API_URL,
     AIBOTK_KEY,
     AIBOTK_TARGET,
+    AIBOTK_API_URL,
     PUSHME_KEY,
+    PUSHME_API_URL,
     CHRONOCAT_URL,
     CHRONOCAT_TOKEN,
     CHRONOCAT_TARGET,
@@ -69,18 +84,21 @@ from config import (
     WEBHOOK_HEADERS,
     WEBHOOK_BODY_TEMPLATE,
 )
+import metrics
+from timing import budget, record_retry_wait, span, stop_on_budget
 
 logger = logging.getLogger(__name__)
 
-# 请求重试装饰器
+# 请求重试装饰器（重试等待从本次运行的共享预算中扣除）
 request_retry = retry(
-    stop=stop_after_attempt(RETRY_ATTEMPTS),
+    stop=stop_after_attempt(RETRY_ATTEMPTS) | stop_on_budget,
     wait=wait_chain(
         wait_fixed(15),
         wait_fixed(30),
         wait_exponential(multiplier=1, min=45, max=120),
     ),
     retry=retry_if_exception_type(Exception),
+    before_sleep=record_retry_wait,
     reraise=True,
 )
 
@@ -130,6 +148,79 @@ def is_low_energy(balances: Dict[str, float]) -> bool:
     return balances["light_Balance"] <= THRESHOLD or balances["ac_Balance"] <= THRESHOLD
 
 
+# ==================== 渠道凭证缓存 ====================
+
+
+class ProviderTokenCache:
+    """
+    需要先换取临时凭证的渠道（如企业微信 access_token）共用的凭证缓存
+
+    凭证保存在 tokens.json 的 "providers" 字段中，与登录 Token 一起由 crypto.py 加密存储，
+    多次运行之间复用；到期前 TOKEN_REFRESH_MARGIN 秒即重新获取。
+    """
+
+    def __init__(self, file_path: str = TOKEN_FILE, margin: int = TOKEN_REFRESH_MARGIN):
+        self.file_path = file_path
+        self.margin = margin
+        self._tokens: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._tokens is None:
+            from storage import load_json
+
+            data = load_json(self.file_path) if path.exists(self.file_path) else None
+            providers = data.get("providers") if isinstance(data, dict) else None
+            self._tokens = providers if isinstance(providers, dict) else {}
+        return self._tokens
+
+    def _save(self) -> None:
+        from storage import atomic_write, data_lock, load_json
+
+        # 与登录 Token 共用文件，只更新 providers 字段；明文凭证不保留滚动备份
+        with data_lock():
+            data = load_json(self.file_path) if path.exists(self.file_path) else None
+            data = data if isinstance(data, dict) else {}
+            data["providers"] = self._tokens
+            content = json.dumps(data, ensure_ascii=False, indent=2)
+            atomic_write(self.file_path, content.encode("utf-8"), backup=False, private=True)
+
+    def get(self, name: str, fetch: Callable[[], Tuple[str, int]], force: bool = False) -> str:
+        """
+        获取凭证，缓存缺失、即将过期或 force 时调用 fetch 重新获取
+
+        Args:
+            name: 缓存键（应包含账号标识，配置变化时不会误用旧凭证）
+            fetch: 获取函数，返回 (凭证, 有效秒数)
+            force: 是否忽略缓存（如服务端返回凭证失效）
+
+        Returns:
+            凭证
+        """
+        with self._lock:
+            tokens = self._load()
+            entry = tokens.get(name)
+            if not force and entry and entry.get("expires_at", 0) - self.margin > time.time():
+                return entry["token"]
+
+            token, expires_in = fetch()
+            tokens[name] = {"token": token, "expires_at": int(time.time() + expires_in)}
+            try:
+                self._save()
+            except Exception as e:
+                logger.warning(f"保存渠道凭证失败: {e}")
+            logger.info(f"已获取 {name.split(':')[0]} 凭证，有效期 {expires_in} 秒")
+            return token
+
+    def invalidate(self, name: str) -> None:
+        """丢弃缓存的凭证"""
+        with self._lock:
+            self._load().pop(name, None)
+
+
+provider_tokens = ProviderTokenCache()
+
+
 # ==================== 通知渠道实现 ====================
 
 
@@ -140,7 +231,8 @@ def send_telegram(title: str, content: str) -> bool:
         logger.debug("未配置 Telegram 参数，跳过")
         return False
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    base_url = TELEGRAM_API_URL or "https://api.telegram.org"
+    url = f"{base_url}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": TELEGRAM_CHAT_ID,
         "text": f"*{title}*\n\n{content}",
@@ -162,13 +254,14 @@ def send_serverchan(title: str, content: str) -> bool:
         logger.debug("未配置 SERVERCHAN_KEYS，跳过")
         return False
 
+    base_url = SERVERCHAN_API_URL or "https://sctapi.ftqq.com"
     success = False
     for key in SERVERCHAN_KEYS.split(","):
         key = key.strip()
         if not key:
             continue
 
-        url = f"https://sctapi.ftqq.com/{key}.send"
+        url = f"{base_url}/{key}.send"
         payload = {"title": title, "desp": content}
         response = requests.post(url, data=payload, timeout=10)
 
@@ -185,23 +278,127 @@ def send_serverchan(title: str, content: str) -> bool:
     return success
 
 
+class EmailTransport:
+    """
+    复用的 SMTP 连接
+
+    一次轮询内只建立一次连接并登录，多封邮件（多个收件人、多条报警）共用，轮询结束时关闭；
+    连接被服务器断开、网络异常或超时时重新连接一次，其余 SMTP 错误（如收件人被拒）交给外层重试。
+    """
+
+    def __init__(self, server: str, port: Optional[str], ssl: bool, user: str, password: str):
+        self.server = server
+        self.port = port
+        self.ssl = ssl
+        self.user = user
+        self.password = password
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import smtplib
+
+        if self.ssl:
+            client = smtplib.SMTP_SSL(self.server, int(self.port or smtplib.SMTP_SSL_PORT), timeout=10)
+        else:
+            client = smtplib.SMTP(self.server, int(self.port or smtplib.SMTP_PORT), timeout=10)
+        try:
+            client.login(self.user, self.password)
+        except BaseException:
+            client.close()
+            raise
+        logger.debug(f"SMTP 已连接: {self.server}")
+        return client
+
+    def _reset(self) -> None:
+        if self._client is not None:
+            try:
+                self._client.close()
+            finally:
+                self._client = None
+
+    def send(self, recipients: List[str], title: str, content: str) -> None:
+        """
+        发送一封邮件给全部收件人
+
+        Args:
+            recipients: 收件人列表
+            title: 邮件标题
+            content: 邮件正文（纯文本）
+        """
+        import smtplib
+        import socket
+        from email.mime.text import MIMEText
+
+        msg = MIMEText(content, "plain", "utf-8")
+        msg["Subject"] = title
+        msg["From"] = self.user
+        msg["To"] = ", ".join(recipients)
+
+        with self._lock:
+            for attempt in range(2):
+                if self._client is None:
+                    self._client = self._connect()
+                try:
+                    self._client.sendmail(self.user, recipients, msg.as_string())
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                    # 连接已失效（如常驻模式下服务器空闲断开），重连后再试一次
+                    self._reset()
+                    if attempt:
+                        raise
+                    logger.info("SMTP 连接已断开，重新连接")
+
+    def close(self) -> None:
+        """结束会话"""
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.quit()
+                except Exception:
+                    pass
+                self._client = None
+
+
+_email_transport: Optional[EmailTransport] = None
+_email_transport_lock = threading.Lock()
+
+
+def get_email_transport() -> EmailTransport:
+    """获取本轮轮询共用的邮件连接（首次发送时建立）"""
+    global _email_transport
+    with _email_transport_lock:
+        if _email_transport is None:
+            _email_transport = EmailTransport(
+                SMTP_SERVER, SMTP_PORT, (SMTP_SSL or "true").lower() != "false", EMAIL, SMTP_CODE
+            )
+        return _email_transport
+
+
+def close_email_transport() -> None:
+    """结束邮件会话（发送 QUIT），之后再发送时重新连接；每轮轮询结束时调用"""
+    with _email_transport_lock:
+        transport = _email_transport
+    if transport is not None:
+        transport.close()
+
+
+def get_email_recipients() -> List[str]:
+    """收件人列表，未配置 EMAIL_TO 时发送给 EMAIL"""
+    recipients = [r.strip() for r in (EMAIL_TO or "").split(",") if r.strip()]
+    return recipients or [EMAIL]
+
+
 @request_retry
 def send_email(title: str, content: str) -> bool:
-    """邮件通知"""
+    """邮件通知（复用同一 SMTP 连接，一封邮件发送给全部收件人）"""
     if not all([EMAIL, SMTP_CODE, SMTP_SERVER]):
         logger.debug("邮件配置不完整，跳过")
         return False
 
-    msg = MIMEText(content, "plain", "utf-8")
-    msg["Subject"] = title
-    msg["From"] = EMAIL
-    msg["To"] = EMAIL
-
-    client = smtplib.SMTP_SSL(SMTP_SERVER, smtplib.SMTP_SSL_PORT)
-    client.login(EMAIL, SMTP_CODE)
-    client.sendmail(EMAIL, EMAIL, msg.as_string())
-    client.quit()
-    logger.info("邮件通知发送成功")
+    recipients = get_email_recipients()
+    get_email_transport().send(recipients, title, content)
+    logger.info(f"邮件通知发送成功（{len(recipients)} 位收件人）")
     return True
 
 
@@ -346,7 +543,8 @@ def send_igot(title: str, content: str) -> bool:
         logger.debug("未配置 IGOT_KEY，跳过")
         return False
 
-    url = f"https://push.hellyw.com/{IGOT_KEY}"
+    base_url = IGOT_API_URL or "https://push.hellyw.com"
+    url = f"{base_url}/{IGOT_KEY}"
     payload = {"title": title, "content": content}
     response = requests.post(url, json=payload, timeout=10)
     result = response.json()
@@ -365,7 +563,8 @@ def send_pushdeer(title: str, content: str) -> bool:
         logger.debug("未配置 PUSHDEER_KEY，跳过")
         return False
 
-    url = "https://api2.pushdeer.com/message/push"
+    base_url = PUSHDEER_API_URL or "https://api2.pushdeer.com"
+    url = f"{base_url}/message/push"
     payload = {"pushkey": PUSHDEER_KEY, "text": title, "desp": content, "type": "text"}
     response = requests.post(url, data=payload, timeout=10)
     result = response.json()
@@ -403,7 +602,8 @@ def send_pushplus(title: str, content: str) -> bool:
         logger.debug("未配置 PUSHPLUS_TOKEN，跳过")
         return False
 
-    url = "https://www.pushplus.plus/send"
+    base_url = PUSHPLUS_API_URL or "https://www.pushplus.plus"
+    url = f"{base_url}/send"
     payload = {"token": PUSHPLUS_TOKEN, "title": title, "content": content}
     response = requests.post(url, json=payload, timeout=10)
     result = response.json()
@@ -415,6 +615,10 @@ def send_pushplus(title: str, content: str) -> bool:
         raise requests.exceptions.RequestException(result.get("msg"))
 
 
+# 企业微信 access_token 无效 / 已过期
+WECOM_TOKEN_ERRORS = (40014, 42001)
+
+
 @request_retry
 def send_wecom(title: str, content: str) -> bool:
     """企业微信通知"""
@@ -422,26 +626,34 @@ def send_wecom(title: str, content: str) -> bool:
         logger.debug("企业微信配置不完整，跳过")
         return False
 
-    # 获取 access_token
-    token_url = f"https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={WECOM_CORP_ID}&corpsecret={WECOM_SECRET}"
-    token_response = requests.get(token_url, timeout=10)
-    token_result = token_response.json()
-
-    if token_result.get("errcode") != 0:
-        raise requests.exceptions.RequestException(token_result.get("errmsg"))
+    base_url = WECOM_API_URL or "https://qyapi.weixin.qq.com"
 
-    access_token = token_result["access_token"]
+    def fetch_token() -> Tuple[str, int]:
+        token_url = f"{base_url}/cgi-bin/gettoken?corpid={WECOM_CORP_ID}&corpsecret={WECOM_SECRET}"
+        token_result = requests.get(token_url, timeout=10).json()
+        if token_result.get("errcode") != 0:
+            raise requests.exceptions.RequestException(token_result.get("errmsg"))
+        return token_result["access_token"], int(token_result.get("expires_in") or 7200)
 
-    # 发送消息
-    send_url = f"https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={access_token}"
+    # access_token 有效期 2 小时且 gettoken 有频率限制，缓存复用
+    token_name = f"wecom:{WECOM_CORP_ID}:{WECOM_AGENT_ID}"
     payload = {
         "touser": WECOM_TOUSER or "@all",
         "msgtype": "text",
         "agentid": WECOM_AGENT_ID,
         "text": {"content": f"{title}\n\n{content}"},
     }
-    response = requests.post(send_url, json=payload, timeout=10)
-    result = response.json()
+
+    access_token = provider_tokens.get(token_name, fetch_token)
+    send_url = f"{base_url}/cgi-bin/message/send?access_token={access_token}"
+    result = requests.post(send_url, json=payload, timeout=10).json()
+
+    if result.get("errcode") in WECOM_TOKEN_ERRORS:
+        # 缓存的凭证已失效（被重置或提前过期），重新获取后再发送一次
+        logger.info(f"企业微信 access_token 失效（{result.get('errcode')}），重新获取")
+        access_token = provider_tokens.get(token_name, fetch_token, force=True)
+        send_url = f"{base_url}/cgi-bin/message/send?access_token={access_token}"
+        result = requests.post(send_url, json=payload, timeout=10).json()
 
     if result.get("errcode") == 0:
         logger.info("企业微信通知发送成功")
@@ -457,7 +669,8 @@ def send_qmsg(title: str, content: str) -> bool:
         logger.debug("未配置 QMSG_KEY，跳过")
         return False
 
-    url = f"https://qmsg.zendee.cn/send/{QMSG_KEY}"
+    base_url = QMSG_API_URL or "https://qmsg.zendee.cn"
+    url = f"{base_url}/send/{QMSG_KEY}"
     payload = {"msg": f"{title}\n\n{content}"}
     if QMSG_QQ:
         payload["qq"] = QMSG_QQ
@@ -479,7 +692,8 @@ def send_aibotk(title: str, content: str) -> bool:
         logger.debug("未配置智能微秘书参数，跳过")
         return False
 
-    url = "https://api-bot.aibotk.com/openapi/v1/chat/send"
+    base_url = AIBOTK_API_URL or "https://api-bot.aibotk.com"
+    url = f"{base_url}/openapi/v1/chat/send"
     headers = {"Authorization": f"Bearer {AIBOTK_KEY}"}
     payload = {"to": AIBOTK_TARGET, "type": 1, "content": f"{title}\n\n{content}"}
     response = requests.post(url, json=payload, headers=headers, timeout=10)
@@ -499,7 +713,8 @@ def send_pushme(title: str, content: str) -> bool:
         logger.debug("未配置 PUSHME_KEY，跳过")
         return False
 
-    url = "https://push.i-i.me/"
+    base_url = PUSHME_API_URL or "https://push.i-i.me"
+    url = f"{base_url}/"
     payload = {"push_key": PUSHME_KEY, "title": title, "content": content}
     response = requests.post(url, data=payload, timeout=10)
 
@@ -535,6 +750,14 @@ def send_chronocat(title: str, content: str) -> bool:
         raise requests.exceptions.RequestException(response.text)
 
 
+def encode_header_value(value: str) -> str:
+    """非 ASCII 的 HTTP 头按 RFC 2047 编码为 =?UTF-8?B?...?=，ASCII 原样返回"""
+    if value.isascii():
+        return value
+    import base64
+    return f"=?UTF-8?B?{base64.b64encode(value.encode('utf-8')).decode('ascii')}?="
+
+
 @request_retry
 def send_ntfy(title: str, content: str) -> bool:
     """ntfy 通知"""
@@ -544,7 +767,8 @@ def send_ntfy(title: str, content: str) -> bool:
 
     base_url = NTFY_URL or "https://ntfy.sh"
     url = f"{base_url}/{NTFY_TOPIC}"
-    headers = {"Title": title}
+    # HTTP 头只能是 latin-1，中文标题按 RFC 2047 编码（ntfy 服务端会解码）
+    headers = {"Title": encode_header_value(title)}
     if NTFY_TOKEN:
         headers["Authorization"] = f"Bearer {NTFY_TOKEN}"
 
@@ -590,6 +814,7 @@ def send_webhook(title: str, content: str) -> bool:
 # ==================== 通知调度 ====================
 
 # 所有通知渠道 (除 Telegram 外)
+# 报警渠道，按优先级从高到低排列
 ALERT_CHANNELS: list[tuple[str, Callable[[str, str], bool]]] = [
     ("Server酱", send_serverchan),
     ("邮件", send_email),
@@ -612,6 +837,39 @@ ALERT_CHANNELS: list[tuple[str, Callable[[str, str], bool]]] = [
 ]
 
 
+def dispatch(
+    name: str, func: Callable[[str, str], bool], title: str, content: str, rank: float = 0.0
+) -> bool:
+    """
+    调用单个通知渠道，记录耗时与结果，失败不影响其他渠道
+
+    Args:
+        name: 渠道名称
+        func: 渠道发送函数
+        title: 通知标题
+        content: 通知内容
+        rank: 优先级位置（0 最高，1 最低），接近运行截止时间时低优先级渠道先被跳过
+
+    Returns:
+        是否发送成功
+    """
+    if not budget.admits(rank):
+        budget.skip(f"notify.{name}")
+        metrics.NOTIFICATIONS.inc(channel=name, result="skipped")
+        return False
+
+    try:
+        with span(f"notify.{name}"):
+            sent = func(title, content)
+    except Exception as e:
+        logger.error(f"{name} 通知失败: {e}")
+        metrics.NOTIFICATIONS.inc(channel=name, result="failure")
+        return False
+
+    metrics.NOTIFICATIONS.inc(channel=name, result="success" if sent else "skipped")
+    return bool(sent)
+
+
 def send_alert(title: str, content: str) -> None:
     """
     发送报警通知 - 发送到所有渠道
@@ -622,19 +880,12 @@ def send_alert(title: str, content: str) -> None:
     """
     logger.info("发送报警通知到所有渠道...")
 
-    # Telegram (使用 Markdown 转义)
-    try:
-        telegram_content = content.replace(".", "\\.")
-        send_telegram(title, telegram_content)
-    except Exception as e:
-        logger.error(f"Telegram 通知失败: {e}")
+    # Telegram (使用 Markdown 转义)，优先级最高
+    dispatch("Telegram", send_telegram, title, content.replace(".", "\\."))
 
-    # 其他渠道
-    for name, func in ALERT_CHANNELS:
-        try:
-            func(title, content)
-        except Exception as e:
-            logger.error(f"{name} 通知失败: {e}")
+    # 其他渠道按列表顺序为优先级，接近截止时间时从末尾开始放弃
+    for rank, (name, func) in enumerate(ALERT_CHANNELS, start=1):
+        dispatch(name, func, title, content, rank / len(ALERT_CHANNELS))
 
 
 def send_daily(title: str, content: str) -> None:
@@ -646,11 +897,7 @@ def send_daily(title: str, content: str) -> None:
         content: 通知内容 (普通文本格式)
     """
     logger.info("发送日常通知到 Telegram...")
-    try:
-        telegram_content = content.replace(".", "\\.")
-        send_telegram(title, telegram_content)
-    except Exception as e:
-        logger.error(f"Telegram 通知失败: {e}")
+    dispatch("Telegram", send_telegram, title, content.replace(".", "\\."))
 
 
 def notify(balances: Dict[str, float]) -> None:
@@ -670,3 +917,40 @@ def notify(balances: Dict[str, float]) -> None:
     else:
         content += "当前电量充足，请保持关注。"
         send_daily(title, content)
+
+
+def notify_rooms(balances: Dict[str, float]) -> None:
+    """
+    整栋楼模式通知：列出低电量房间
+
+    Args:
+        balances: 房间号 -> 剩余电量
+    """
+    low_rooms = {room: b for room, b in balances.items() if b <= THRESHOLD}
+
+    if low_rooms:
+        title = "⚠️宿舍电量预警⚠️"
+        lines = [f"🏠 {room}：{b} 度（{get_status(b)}）" for room, b in sorted(low_rooms.items())]
+        content = "\n".join(lines) + f"\n\n⚠️ {len(low_rooms)} 个房间电量不足，请尽快充电！"
+        send_alert(title, content)
+    else:
+        title = "🏠宿舍电量通报🏠"
+        content = f"共 {len(balances)} 个房间，当前电量均充足，请保持关注。"
+        send_daily(title, content)
+
+
+def notify_anomalies(anomalies: List[Dict]) -> None:
+    """
+    用电异常报警：发送到所有渠道
+
+    Args:
+        anomalies: anomaly.detect_anomalies 的结果
+    """
+    labels = {"light": "💡 照明", "ac": "❄️ 空调"}
+    lines = []
+    for a in anomalies:
+        usual = f"约为平时 {a['hour']} 点前后的 {a['ratio']} 倍" if a["ratio"] else \
+            f"平时 {a['hour']} 点前后几乎不耗电"
+        lines.append(f"{labels.get(a['series'], '🏠 ' + a['series'])}：{a['rate']} 度/小时，{usual}")
+    content = "\n".join(lines) + "\n\n⚡ 用电速率异常，请检查是否有电器未关闭或电表故障！"
+    send_alert("⚡宿舍用电异常⚡", content)
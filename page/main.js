@@ -147,6 +147,7 @@ chartLight = echarts.init(document.getElementById('chart-light'));
 chartAc = echarts.init(document.getElementById('chart-ac'));
 let currentChartType = 'area';
 let rawData = [];
+let ledger = null; // 后端生成的按天账本（ledger.json），区分用电与充值
 
 function getChartColors() {
     const style = getComputedStyle(document.documentElement);
@@ -286,6 +287,19 @@ function updateChartsTheme() {
 }
 
 // ==================== 数据处理 ====================
+// 展开重复读数压缩的记录：{time, ..., until, repeat} 还原为开始、结束两个读数点
+function expandRecords(dataArray) {
+    const expanded = [];
+    dataArray.forEach(record => {
+        const { until, repeat, ...base } = record;
+        expanded.push(base);
+        if (until) {
+            expanded.push({ ...base, time: until });
+        }
+    });
+    return expanded;
+}
+
 function interpolateMissingData(dataArray) {
     const processed = [...dataArray];
     ['light_Balance', 'ac_Balance'].forEach(field => {
@@ -362,6 +376,14 @@ function parseTimeString(timeStr) {
     }
 }
 
+// 获取账本中某天的汇总 {light, ac}，无账本或无该日数据时对应字段为 undefined
+function getLedgerDay(date) {
+    if (!ledger || !ledger.series) return {};
+    const key = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+    const day = name => (ledger.series[name] && ledger.series[name].days || {})[key];
+    return { light: day('light'), ac: day('ac') };
+}
+
 function calculateStats(data) {
     // 数据验证
     if (!ValidationUtils.isValidArray(data, 2)) {
@@ -441,8 +463,8 @@ function calculateStats(data) {
             : '∞';
 
         // 计算今日已消耗（今日0点/最早记录 - 当前记录 = 消耗量，正值表示消耗）
-        const lightTrend = ((baseline.light_Balance || 0) - (latest.light_Balance || 0)).toFixed(1);
-        const acTrend = ((baseline.ac_Balance || 0) - (latest.ac_Balance || 0)).toFixed(1);
+        let lightTrend = ((baseline.light_Balance || 0) - (latest.light_Balance || 0)).toFixed(1);
+        let acTrend = ((baseline.ac_Balance || 0) - (latest.ac_Balance || 0)).toFixed(1);
 
         // 计算昨日消耗
         // 找到昨日0点
@@ -470,6 +492,14 @@ function calculateStats(data) {
             acYesterdayTrend = acYesterdayTrend.toFixed(1);
         }
 
+        // 账本可用时，今日/昨日消耗使用账本中的用电量（不受充值跳变影响）
+        const todayLedger = getLedgerDay(todayStart);
+        const yesterdayLedger = getLedgerDay(yesterdayStart);
+        if (todayLedger.light) lightTrend = todayLedger.light.consumption.toFixed(1);
+        if (todayLedger.ac) acTrend = todayLedger.ac.consumption.toFixed(1);
+        if (yesterdayLedger.light) lightYesterdayTrend = yesterdayLedger.light.consumption.toFixed(1);
+        if (yesterdayLedger.ac) acYesterdayTrend = yesterdayLedger.ac.consumption.toFixed(1);
+
         return {
             lightTrend: lightTrend,
             acTrend: acTrend,
@@ -570,15 +600,41 @@ function renderCharts(data, type = 'line') {
 }
 
 // ==================== 数据加载 ====================
-async function fetchData(filepath) {
-    const response = await fetch(filepath);
+// 月份 -> 发布文件名映射（已结束月份使用内容哈希文件名，可永久缓存）
+let monthFiles = {};
+
+async function fetchData(filepath, immutable = false) {
+    const response = await fetch(filepath, { cache: immutable ? 'force-cache' : 'no-cache' });
     return response.json();
 }
 
+// 加载 time.json，兼容旧版纯列表格式
+async function fetchTimeList() {
+    const timeData = await fetchData('./data/time.json');
+    if (Array.isArray(timeData)) {
+        monthFiles = {};
+        return timeData;
+    }
+    monthFiles = timeData.files || {};
+    return timeData.months || [];
+}
+
+function fetchMonthData(month) {
+    const file = monthFiles[month];
+    if (file && file !== `${month}.json`) {
+        return fetchData(`./data/${file}`, true).then(expandRecords);
+    }
+    return fetchData(`./data/${month}.json`).then(expandRecords);
+}
+
 async function loadData() {
     try {
         const sel = document.getElementById('timeSplit').value;
-        const data = await fetchData(`./data/${sel}.json`);
+        const [data, ledgerData] = await Promise.all([
+            fetchMonthData(sel),
+            fetchData('./data/ledger.json').catch(() => null)
+        ]);
+        ledger = ledgerData;
         rawData = interpolateMissingData(data);
         updateUI(rawData);
         renderCharts(rawData, currentChartType);
@@ -640,7 +696,7 @@ window.addEventListener('resize', () => {
 });
 
 // ==================== 初始化 ====================
-fetchData('./data/time.json').then(timeData => {
+fetchTimeList().then(timeData => {
     const sel = document.getElementById('timeSplit');
     timeData.forEach(v => {
         const opt = document.createElement('option');
@@ -664,6 +720,7 @@ const yearSelect = document.getElementById('report-year-select');
 let chartDaily = null;
 let chartMonthly = null;
 let chartHeatmap = null;
+let chartProfile = null;
 let yearlyData = {};
 let availableYears = [];
 
@@ -691,7 +748,7 @@ yearSelect.addEventListener('change', async () => {
 // 初始化年份选择器
 async function initYearSelect() {
     try {
-        const timeList = await fetchData('./data/time.json');
+        const timeList = await fetchTimeList();
 
         // 提取所有年份
         const years = [...new Set(timeList.map(m => m.split('-')[0]))].sort().reverse();
@@ -722,7 +779,7 @@ async function loadYearlyReport(year) {
         showToast('正在加载年度数据...', 'info');
 
         // 获取时间列表
-        const timeList = await fetchData('./data/time.json');
+        const timeList = await fetchTimeList();
 
         // 筛选指定年份的月份文件
         const yearMonths = timeList.filter(m => m.startsWith(year.toString()));
@@ -736,7 +793,7 @@ async function loadYearlyReport(year) {
         const allData = [];
         for (const month of yearMonths) {
             try {
-                const monthData = await fetchData(`./data/${month}.json`);
+                const monthData = await fetchMonthData(month);
                 allData.push(...monthData.map(d => ({ ...d, month })));
             } catch (e) {
                 console.warn(`加载 ${month} 数据失败`);
@@ -755,12 +812,14 @@ async function loadYearlyReport(year) {
         renderDailyChart(allData, year);
         renderMonthlyChart(allData, year);
         renderHeatmapChart(allData, year);
+        await renderProfileChart(year);
 
         // 确保图表正确 resize (模态框可能影响尺寸计算)
         setTimeout(() => {
             if (chartDaily) chartDaily.resize();
             if (chartMonthly) chartMonthly.resize();
             if (chartHeatmap) chartHeatmap.resize();
+            if (chartProfile) chartProfile.resize();
         }, 100);
 
         showToast('年度报告加载完成', 'success');
@@ -770,9 +829,24 @@ async function loadYearlyReport(year) {
     }
 }
 
-// 计算年度统计数据
-function calculateYearlyStats(data, year) {
-    // 按日期分组计算每日消耗
+// 从账本中取出某年的每日用电量 {date: {light, ac}}，账本缺失或无该年数据时返回 null
+function getLedgerYear(year) {
+    if (!ledger || !ledger.series) return null;
+    const prefix = `${year}-`;
+    const result = {};
+    ['light', 'ac'].forEach(name => {
+        const days = ledger.series[name] && ledger.series[name].days || {};
+        Object.entries(days).forEach(([date, day]) => {
+            if (!date.startsWith(prefix)) return;
+            if (!result[date]) result[date] = { light: 0, ac: 0 };
+            result[date][name] = day.consumption || 0;
+        });
+    });
+    return Object.keys(result).length > 0 ? result : null;
+}
+
+// 由原始读数的首尾差值估算每日消耗（ledger.json 缺失时的回退，充值与数据缺失会造成偏差）
+function calculateRawDailyConsumption(data, year) {
     const dailyConsumption = {};
 
     // 解析日期字符串，返回 YYYY-MM-DD 格式
@@ -875,6 +949,14 @@ function calculateYearlyStats(data, year) {
         }
     });
 
+    return dailyConsumption;
+}
+
+// 计算年度统计数据
+function calculateYearlyStats(data, year) {
+    // 按天汇总的用电量：优先使用账本（已区分用电、充值与数据缺失），无账本时回退到原始读数差值
+    const dailyConsumption = getLedgerYear(year) || calculateRawDailyConsumption(data, year);
+
     // 先计算总消耗（只使用实际数据，不包括插值数据）
     let totalLight = 0, totalAc = 0;
     let peakDay = '', peakValue = 0;
@@ -1256,6 +1338,86 @@ function renderHeatmapChart(data, year) {
     chartHeatmap.setOption(option);
 }
 
+// 用电时段画像：后端按 "星期 × 小时" 汇总（data/profiles/），无需下载原始记录
+async function renderProfileChart(year) {
+    let index;
+    try {
+        index = await fetchData('./data/profiles/index.json');
+    } catch (e) {
+        console.warn('用电画像: 无数据');
+        return;
+    }
+
+    // 各序列分别求平均功率（度/小时）后相加，照明与空调的读数覆盖时长可能不同
+    const power = Array.from({ length: 7 }, () => new Array(24).fill(0));
+    for (const name of ['light', 'ac']) {
+        const months = ((index.series || {})[name] || {}).months || [];
+        const profiles = await Promise.all(
+            months.filter(m => m.startsWith(year.toString()))
+                .map(m => fetchData(`./data/profiles/${name}/${m}.json`).catch(() => null))
+        );
+        for (let day = 0; day < 7; day++) {
+            for (let hour = 0; hour < 24; hour++) {
+                let consumption = 0, hours = 0;
+                profiles.filter(Boolean).forEach(p => {
+                    consumption += p.consumption[day][hour];
+                    hours += p.hours[day][hour];
+                });
+                if (hours > 0) power[day][hour] += consumption / hours;
+            }
+        }
+    }
+
+    if (!chartProfile) {
+        chartProfile = echarts.init(document.getElementById('chart-profile'));
+    }
+
+    const colors = getChartColors();
+    const weekdays = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'];
+    const data = [];
+    let maxValue = 0;
+    power.forEach((row, day) => row.forEach((value, hour) => {
+        const v = parseFloat(value.toFixed(3));
+        data.push([hour, day, v]);
+        if (v > maxValue) maxValue = v;
+    }));
+
+    chartProfile.setOption({
+        tooltip: {
+            formatter: params => `${weekdays[params.value[1]]} ${params.value[0]}:00<br/>平均: ${params.value[2]} 度/小时`
+        },
+        grid: { top: 60, left: 50, right: 20, bottom: 30 },
+        xAxis: {
+            type: 'category',
+            data: Array.from({ length: 24 }, (_, h) => `${h}`),
+            axisLabel: { color: colors.textSecondary },
+            splitArea: { show: true }
+        },
+        yAxis: {
+            type: 'category',
+            data: weekdays,
+            axisLabel: { color: colors.textSecondary },
+            splitArea: { show: true }
+        },
+        visualMap: {
+            min: 0,
+            max: Math.max(0.1, maxValue),
+            calculable: true,
+            orient: 'horizontal',
+            left: 'center',
+            top: 0,
+            inRange: {
+                color: ['#e3f2fd', '#90caf9', '#42a5f5', '#1e88e5', '#1565c0', '#0d47a1']
+            },
+            textStyle: { color: colors.textSecondary }
+        },
+        series: [{
+            type: 'heatmap',
+            data: data
+        }]
+    });
+}
+
 // 导出图片功能
 exportBtn.addEventListener('click', async () => {
     showToast('正在生成图片...', 'info');
@@ -1334,6 +1496,7 @@ window.addEventListener('resize', () => {
     if (chartDaily) chartDaily.resize();
     if (chartMonthly) chartMonthly.resize();
     if (chartHeatmap) chartHeatmap.resize();
+    if (chartProfile) chartProfile.resize();
 });
 
 // ==================== 房间查询器功能 ====================
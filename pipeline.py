@@ -0,0 +1,243 @@
+"""
+运行流水线模块
+
+一次轮询的结果（PollResult）发布给多个相互独立的输出端（sink）:
+- storage: 写入数据文件
+- notify: 发送通知
+- metrics: 更新 Prometheus 指标
+- ledger: 增量更新消耗 / 充值账本
+- anomaly: 按房间、按小时的基线检测用电异常并报警
+- profiles: 增量更新 "星期 × 小时" 用电画像
+- markdown: 渲染状态表（内容变化时才重写）并写入 GitHub Actions 运行摘要
+
+各输出端在线程池中并发执行，单个输出端失败或变慢不影响其他输出端（如通知重试不再阻塞数据写入）。
+只有 REQUIRED_SINKS（数据写入）失败时本轮轮询才算失败，其余输出端的失败只记录日志，
+读数已写入时工作流仍会发布。
+
+第三方输出端无需修改 main.py:
+- 代码中调用 register_sink(name, func)
+- 或设置环境变量 PIPELINE_SINKS="模块:函数,..."，函数签名为 func(result: PollResult) -> None
+"""
+import importlib
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import LIGHT_ROOM, AC_ROOM, PIPELINE_SINKS, STEP_SUMMARY_FILE, STATUS_FILE
+import metrics
+from timing import span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PollResult:
+    """
+    一次轮询的结果
+
+    Attributes:
+        time: 记录时间（"MM-DD HH:MM:SS"）
+        balances: 默认模式为 {"light_Balance", "ac_Balance"}，整栋楼模式为 {房间号: 电量}
+        rooms: 是否为整栋楼模式
+    """
+
+    time: str
+    balances: Dict[str, float]
+    rooms: bool = False
+
+    def readings(self) -> Dict[str, float]:
+        """按序列键（"light" / "ac" / 房间号）返回余额"""
+        if self.rooms:
+            return dict(self.balances)
+        return {"light": self.balances["light_Balance"], "ac": self.balances["ac_Balance"]}
+
+
+Sink = Callable[[PollResult], None]
+
+# 已注册的输出端（按注册顺序）
+SINKS: Dict[str, Sink] = {}
+# 输出端 -> 需先完成的输出端（如 Markdown 渲染依赖存储写入的 latest.json）
+DEPENDENCIES: Dict[str, Tuple[str, ...]] = {}
+# 失败时本轮轮询视为失败的输出端
+REQUIRED_SINKS: Tuple[str, ...] = ("storage",)
+# 余额缓存刷新（命令行查询、/balance）只执行的输出端：写入读数，不发送通知、不检测异常
+REFRESH_SINKS: Tuple[str, ...] = ("storage", "metrics")
+
+
+def register_sink(name: str, func: Optional[Sink] = None, after: Tuple[str, ...] = ()):
+    """
+    注册输出端，可直接调用或作为装饰器使用
+
+    Args:
+        name: 输出端名称（同名覆盖）
+        func: 输出端函数，接收 PollResult
+        after: 需先完成的输出端名称（无论成功与否），其余输出端并发执行
+    """
+    def decorator(f: Sink) -> Sink:
+        SINKS[name] = f
+        DEPENDENCIES[name] = tuple(after)
+        return f
+
+    return decorator(func) if func else decorator
+
+
+def unregister_sink(name: str) -> None:
+    """移除输出端"""
+    SINKS.pop(name, None)
+    DEPENDENCIES.pop(name, None)
+
+
+def load_plugin_sinks(spec: Optional[str] = PIPELINE_SINKS) -> list[str]:
+    """
+    按 "模块:函数,..." 加载第三方输出端
+
+    Args:
+        spec: 输出端列表，默认读取 PIPELINE_SINKS
+
+    Returns:
+        成功加载的输出端名称
+    """
+    loaded = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        module_name, _, attr = item.partition(":")
+        try:
+            func = getattr(importlib.import_module(module_name), attr or "sink")
+        except (ImportError, AttributeError) as e:
+            logger.error(f"加载输出端 {item} 失败: {e}")
+            continue
+        register_sink(item, func)
+        loaded.append(item)
+    return loaded
+
+
+def _run_sink(name: str, func: Sink, result: PollResult, waits: List[Future]) -> bool:
+    wait(waits)
+    try:
+        with span(f"stage.{name}"):
+            func(result)
+        return True
+    except Exception as e:
+        logger.error(f"输出端 {name} 失败: {e}")
+        return False
+
+
+def publish(result: PollResult, sinks: Optional[Dict[str, Sink]] = None) -> Dict[str, bool]:
+    """
+    将轮询结果并发发布给所有输出端，等待全部完成
+
+    Args:
+        result: 轮询结果
+        sinks: 输出端，默认为已注册的全部输出端
+
+    Returns:
+        {输出端名称: 是否成功}
+    """
+    sinks = SINKS if sinks is None else sinks
+    if not sinks:
+        return {}
+
+    # 每个输出端独占一个线程，等待依赖时不会占满线程池
+    futures: Dict[str, Future] = {}
+    with ThreadPoolExecutor(max_workers=len(sinks), thread_name_prefix="sink") as executor:
+        for name, func in sinks.items():
+            waits = [futures[dep] for dep in DEPENDENCIES.get(name, ()) if dep in futures]
+            futures[name] = executor.submit(_run_sink, name, func, result, waits)
+        return {name: future.result() for name, future in futures.items()}
+
+
+# ==================== 内置输出端 ====================
+
+@register_sink("storage")
+def storage_sink(result: PollResult) -> None:
+    """写入数据文件"""
+    from storage import (
+        record_energy_data, record_room_batch, update_time_list, update_last_records,
+        update_latest,
+    )
+
+    if result.rooms:
+        record_room_batch({
+            room: {"time": result.time, "balance": balance}
+            for room, balance in result.balances.items()
+        })
+        update_latest(result.time, result.readings())
+        return
+
+    record_energy_data({
+        "time": result.time,
+        "light_Balance": result.balances["light_Balance"],
+        "ac_Balance": result.balances["ac_Balance"],
+    })
+    update_time_list()
+    update_last_records()
+    update_latest(result.time, result.readings())
+
+
+@register_sink("notify")
+def notify_sink(result: PollResult) -> None:
+    """发送通知（notify 模块较重，按需导入）"""
+    from notify import notify, notify_rooms
+
+    if result.rooms:
+        notify_rooms(result.balances)
+    else:
+        notify(result.balances)
+
+
+@register_sink("metrics")
+def metrics_sink(result: PollResult) -> None:
+    """更新余额与消耗速率指标"""
+    if result.rooms:
+        for room, balance in result.balances.items():
+            metrics.observe_balance(room, "room", balance)
+        return
+
+    metrics.observe_balance(LIGHT_ROOM, "light", result.balances["light_Balance"])
+    metrics.observe_balance(AC_ROOM, "ac", result.balances["ac_Balance"])
+
+
+@register_sink("ledger", after=("storage",))
+def ledger_sink(result: PollResult) -> None:
+    """增量更新按天汇总的消耗账本"""
+    from ledger import update_ledger
+
+    update_ledger()
+
+
+@register_sink("profiles", after=("storage",))
+def profiles_sink(result: PollResult) -> None:
+    """增量更新按月的 "星期 × 小时" 用电画像"""
+    from profiles import update_profiles
+
+    update_profiles()
+
+
+@register_sink("anomaly")
+def anomaly_sink(result: PollResult) -> None:
+    """检测消耗速率异常，新出现的异常通过通知渠道报警"""
+    from anomaly import detect_anomalies
+
+    anomalies = detect_anomalies(result.time, result.readings())
+    if anomalies:
+        from notify import notify_anomalies
+
+        notify_anomalies(anomalies)
+
+
+@register_sink("markdown", after=("storage",))
+def markdown_sink(result: PollResult) -> None:
+    """根据 latest.json 渲染状态表（内容变化时才重写），并写入 GitHub Actions 运行摘要"""
+    from markdown import render_latest, write_if_changed
+    from storage import load_latest
+
+    content = render_latest(load_latest())
+    if STATUS_FILE and write_if_changed(STATUS_FILE, content):
+        logger.info(f"状态表已更新: {STATUS_FILE}")
+
+    if STEP_SUMMARY_FILE:
+        with open(STEP_SUMMARY_FILE, "a", encoding="utf-8") as f:
+            f.write(content)
@@ -0,0 +1,163 @@
+"""
+用电时段画像模块
+
+按 "星期 × 小时" 汇总每个序列（"light" / "ac" / 房间号）每个月的用电量，
+前端无需下载原始记录即可展示负载画像。
+
+相邻两次读数之间的用电量按时长平均分摊到所跨越的每个小时（读数间隔通常为数小时），
+同时记录每个格子被读数覆盖的时长，平均功率 = consumption / hours，不受轮询频率影响。
+充值与间隔超过 LEDGER_GAP_HOURS 的区间不计入。
+
+文件布局:
+    data/profiles/index.json          {"series": {key: {"cursor": {...}, "months": ["2025-01", ...]}}}
+    data/profiles/<key>/<YYYY-MM>.json {"consumption": [[24 个小时] x 7 天], "hours": [[...] x 7]}
+
+星期按 Python 约定，0 为周一。每个序列记录处理到的位置（cursor），之后每次运行只处理新增读数。
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+from os import path
+from typing import Dict, Optional
+
+from config import LEDGER_GAP_HOURS, PROFILE_DIR
+from ledger import iter_readings, list_series
+from storage import load_json, locked, save_json
+from timeutil import month_key, parse_record_time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INDEX_FILE = path.join(PROFILE_DIR, "index.json")
+
+DAYS = 7
+HOURS = 24
+
+
+def get_profile_path(key: str, month: str) -> str:
+    """获取画像文件路径（序列键中的路径分隔符等字符替换为下划线）"""
+    return path.join(PROFILE_DIR, re.sub(r"[^\w.-]", "_", key).lstrip("."), f"{month}.json")
+
+
+def load_profile_index() -> Dict:
+    """
+    读取画像索引
+
+    Returns:
+        {"series": {key: {"cursor", "months"}}}，不存在时返回空结构
+    """
+    index = load_json(PROFILE_INDEX_FILE) if path.exists(PROFILE_INDEX_FILE) else None
+    if not isinstance(index, dict):
+        index = {}
+    index.setdefault("series", {})
+    return index
+
+
+def load_profile(key: str, month: str) -> Dict:
+    """
+    读取某个序列某个月的画像
+
+    Returns:
+        {"consumption": 7x24, "hours": 7x24}，不存在时返回全零
+    """
+    file_path = get_profile_path(key, month)
+    profile = load_json(file_path) if path.exists(file_path) else None
+    if not isinstance(profile, dict):
+        profile = {
+            "consumption": [[0.0] * HOURS for _ in range(DAYS)],
+            "hours": [[0.0] * HOURS for _ in range(DAYS)],
+        }
+    return profile
+
+
+def spread(
+    profiles: Dict[str, Dict], key: str, start: datetime, end: datetime, amount: float
+) -> None:
+    """
+    将一段区间的用电量按时长分摊到所跨越的每个小时，原地累加
+
+    Args:
+        profiles: 本次更新涉及的画像 {月份: 画像}，缺失时按需读取
+        key: 序列键
+        start: 区间开始
+        end: 区间结束
+        amount: 区间内的用电量
+    """
+    total = (end - start).total_seconds()
+    cursor = start
+    while cursor < end:
+        boundary = min(end, cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+        seconds = (boundary - cursor).total_seconds()
+        month = month_key(cursor)
+        if month not in profiles:
+            profiles[month] = load_profile(key, month)
+        profile = profiles[month]
+        day, hour = cursor.weekday(), cursor.hour
+        profile["consumption"][day][hour] += amount * seconds / total
+        profile["hours"][day][hour] += seconds / 3600
+        cursor = boundary
+
+
+def update_series(entry: Dict, key: str, room: Optional[str], field: str) -> int:
+    """
+    处理一个序列的新增读数，写入涉及的月份画像并原地更新索引条目
+
+    Args:
+        entry: 索引中的序列 {"cursor", "months"}
+        key: 序列键
+        room: 房间号，默认布局为 None
+        field: 余额字段
+
+    Returns:
+        处理的读数数量
+    """
+    cursor = entry.get("cursor")
+    profiles: Dict[str, Dict] = {}
+    count = 0
+
+    for month, time_str, balance in iter_readings(room, field, cursor):
+        if cursor:
+            start = parse_record_time(cursor["time"], cursor["month"])
+            end = parse_record_time(time_str, month)
+            used = cursor["balance"] - balance
+            if start and end and start < end and used >= 0 and \
+                    (end - start).total_seconds() <= LEDGER_GAP_HOURS * 3600:
+                spread(profiles, key, start, end, used)
+
+        cursor = {"month": month, "time": time_str, "balance": balance}
+        count += 1
+
+    for month, profile in profiles.items():
+        for name in ("consumption", "hours"):
+            profile[name] = [[round(v, 4) for v in row] for row in profile[name]]
+        save_json(profile, get_profile_path(key, month), indent=None, backup=False)
+
+    entry["cursor"] = cursor
+    entry["months"] = sorted(set(entry.get("months") or []) | set(profiles))
+    return count
+
+
+@locked
+def update_profiles() -> Dict:
+    """
+    增量更新所有序列的用电时段画像
+
+    Returns:
+        更新后的画像索引
+    """
+    index = load_profile_index()
+    processed = 0
+    for key, field, room in list_series():
+        entry = index["series"].setdefault(key, {})
+        processed += update_series(entry, key, room, field)
+
+    if processed:
+        save_json(index, PROFILE_INDEX_FILE)
+        logger.info(f"用电画像已更新，新增 {processed} 条读数")
+    return index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    result = update_profiles()
+    for series_key, series_entry in result["series"].items():
+        print(f"{series_key}: {len(series_entry.get('months') or [])} 个月")
@@ -3,32 +3,110 @@
 
 负责电量数据的持久化存储和管理
 """
+import hashlib
 import json
 import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
+from itertools import islice
 from glob import glob
-from os import makedirs, path
-from typing import Dict, List, Optional, Union
+from os import makedirs, path, remove
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-import pytz
+try:
+    import fcntl
+except ImportError:  # Windows 下仅保证进程内互斥
+    fcntl = None
 
-from config import DATA_DIR, TIME_FILE, LAST_RECORDS_FILE, TIMEZONE
+from config import (
+    DATA_DIR, TIME_FILE, LAST_RECORDS_FILE, ROOM_INDEX_FILE, LAST_RECORDS_COUNT,
+    LATEST_FILE, RATE_SMOOTHING, RECORD_HEARTBEAT,
+    BACKUP_DIR, TOKEN_FILE, LOCK_FILE, LOCK_TIMEOUT, MONTH_HASH_LENGTH,
+)
+from timing import span
+from timeutil import get_cst_time, month_key, parse_month, parse_record_time
 
 logger = logging.getLogger(__name__)
 
+# 数据目录锁：线程间用 RLock，进程间用 fcntl 咨询锁，支持同一线程嵌套获取
+_thread_lock = threading.RLock()
+_lock_depth = 0
+_lock_fd = None
 
-def get_cst_time(fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
+# 已知文件的内容摘要：绝对路径 -> (大小, 修改时间, SHA-256)，文件未被外部修改时无需重新读取
+_file_digests: Dict[str, Tuple[int, int, str]] = {}
+# 已确认为完整 JSON 的文件：绝对路径 -> (大小, 修改时间)，未被外部修改时无需重新解析
+_valid_files: Dict[str, Tuple[int, int]] = {}
+# 本次运行中内容发生变化（实际写入）的文件（不含滚动备份）
+_changed_files: List[str] = []
+_digest_lock = threading.Lock()
+
+# 新文件的默认权限（与普通 open() 创建的文件一致：0666 去掉 umask）；mkstemp 创建的临时文件为 0600
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+def _acquire_file_lock(timeout: float) -> Optional[int]:
+    """获取进程间文件锁，超时抛出 TimeoutError"""
+    if fcntl is None:
+        return None
+
+    makedirs(path.dirname(LOCK_FILE) or ".", exist_ok=True)
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                raise TimeoutError(f"等待数据目录锁超时: {LOCK_FILE}")
+            time.sleep(0.05)
+
+
+@contextmanager
+def data_lock(timeout: float = LOCK_TIMEOUT):
     """
-    获取中国标准时间字符串
+    数据目录写锁
 
-    Args:
-        fmt: 时间格式
+    保护 读取-修改-写入 过程，多个 main.py 实例（如不同房间）可安全并发写入。
+    同一线程内可重入。
 
-    Returns:
-        格式化的时间字符串
+    Args:
+        timeout: 等待超时（秒）
     """
-    tz = pytz.timezone(TIMEZONE)
-    return datetime.now(tz).strftime(fmt)
+    global _lock_depth, _lock_fd
+
+    with _thread_lock:
+        if _lock_depth == 0:
+            _lock_fd = _acquire_file_lock(timeout)
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0 and _lock_fd is not None:
+                fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+                os.close(_lock_fd)
+                _lock_fd = None
+
+
+def locked(func):
+    """在数据目录写锁内执行被装饰的函数"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with data_lock():
+            return func(*args, **kwargs)
+    return wrapper
 
 
 def load_json(file_path: str) -> Optional[Union[List, Dict]]:
@@ -49,33 +127,418 @@ def load_json(file_path: str) -> Optional[Union[List, Dict]]:
         return None
 
 
-def save_json(data: Union[List, Dict], file_path: str, indent: int = 2) -> bool:
+def _fsync_dir(dir_path: str) -> None:
+    """同步目录项，确保 rename 落盘（仅 POSIX）"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(dir_path or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _remember_valid(file_path: str) -> None:
+    """记录文件当前版本为完整 JSON（按大小与修改时间识别）"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return
+    with _digest_lock:
+        _valid_files[path.abspath(file_path)] = (stat.st_size, stat.st_mtime_ns)
+
+
+def _is_valid_json(file_path: str) -> bool:
+    """判断文件是否为完整可解析的 JSON（本进程写入或校验过且未被修改的文件不再重新解析）"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    with _digest_lock:
+        known = _valid_files.get(path.abspath(file_path))
+    if known == (stat.st_size, stat.st_mtime_ns):
+        return True
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            json.load(f)
+    except (OSError, ValueError):
+        return False
+    _remember_valid(file_path)
+    return True
+
+
+def get_backup_path(file_path: str) -> str:
+    """获取文件对应的滚动备份路径（保留相对数据目录的子目录结构）"""
+    rel_path = path.relpath(path.abspath(file_path), path.abspath(DATA_DIR))
+    if rel_path.startswith(".."):
+        rel_path = path.basename(file_path)
+    return path.join(BACKUP_DIR, f"{rel_path}.bak")
+
+
+def file_digest(file_path: str) -> Optional[str]:
+    """
+    计算文件内容的 SHA-256（按大小与修改时间缓存）
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        十六进制摘要，文件不存在时返回 None
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+    key = path.abspath(file_path)
+    with _digest_lock:
+        cached = _file_digests.get(key)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    with _digest_lock:
+        _file_digests[key] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def _is_unchanged(file_path: str, content: bytes) -> bool:
+    """目标文件内容是否与待写入内容完全相同（大小不同时无需读取）"""
+    try:
+        if os.stat(file_path).st_size != len(content):
+            return False
+    except FileNotFoundError:
+        return False
+    return file_digest(file_path) == hashlib.sha256(content).hexdigest()
+
+
+def _mark_changed(file_path: str, content: bytes) -> None:
+    """记录写入后的摘要与变化文件（只有数据目录中的文件会被发布，才计入变化文件）"""
+    stat = os.stat(file_path)
+    published = not path.relpath(path.abspath(file_path), path.abspath(DATA_DIR)).startswith("..")
+    with _digest_lock:
+        _file_digests[path.abspath(file_path)] = (
+            stat.st_size, stat.st_mtime_ns, hashlib.sha256(content).hexdigest()
+        )
+        if published and file_path not in _changed_files:
+            _changed_files.append(file_path)
+
+
+def get_changed_files() -> List[str]:
+    """获取本次运行中内容发生变化的文件（按写入顺序）"""
+    with _digest_lock:
+        return list(_changed_files)
+
+
+def reset_changed_files() -> None:
+    """清空变化文件列表（常驻模式每轮开始前调用）"""
+    with _digest_lock:
+        _changed_files.clear()
+
+
+def _backup_previous(file_path: str) -> None:
+    """
+    将即将被替换的旧版本保存为滚动备份
+
+    优先使用硬链接：旧版本在 rename 后只由备份路径引用，不产生额外的数据读写；
+    文件系统不支持硬链接时退回复制。
+    """
+    backup_path = get_backup_path(file_path)
+    backup_dir = path.dirname(backup_path)
+    makedirs(backup_dir, exist_ok=True)
+    tmp_path = path.join(backup_dir, f".{path.basename(backup_path)}.{os.getpid()}.tmp")
+    if path.exists(tmp_path):
+        remove(tmp_path)
+
+    try:
+        os.link(file_path, tmp_path)
+    except OSError:
+        shutil.copyfile(file_path, tmp_path)
+    os.replace(tmp_path, backup_path)
+    _fsync_dir(backup_dir)
+
+
+def atomic_write(
+    file_path: str, content: bytes, backup: bool = True, private: bool = False
+) -> bool:
+    """
+    原子写入文件：临时文件 + fsync + rename
+
+    进程在任意时刻被终止，目标文件要么是旧版本，要么是新版本，不会被截断。
+    内容与现有文件完全相同时跳过写入，文件不会产生变更。
+
+    Args:
+        file_path: 目标文件路径
+        content: 文件内容
+        backup: 是否将旧版本保存为滚动备份（仅在旧版本完整时）
+        private: 是否仅允许所有者读写（0600，如 Token 文件），否则按 umask 设置权限
+
+    Returns:
+        是否实际写入
+    """
+    if _is_unchanged(file_path, content):
+        logger.debug(f"内容未变化，跳过写入: {file_path}")
+        return False
+
+    dir_path = path.dirname(file_path)
+    if dir_path and not path.exists(dir_path):
+        makedirs(dir_path, exist_ok=True)
+
+    if backup and path.exists(file_path) and _is_valid_json(file_path):
+        _backup_previous(file_path)
+
+    with span("storage.write", file=path.basename(file_path), bytes=len(content)):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=dir_path or ".", prefix=f".{path.basename(file_path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if hasattr(os, "fchmod"):
+                    os.fchmod(f.fileno(), 0o600 if private else FILE_MODE)
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if path.exists(tmp_path):
+                remove(tmp_path)
+            raise
+
+        _fsync_dir(dir_path)
+
+    _mark_changed(file_path, content)
+    return True
+
+
+def _format_element(item: Dict) -> bytes:
+    """按 save_json（indent=2）写出数组时的格式序列化一个元素（含外层两格缩进）"""
+    text = json.dumps(item, ensure_ascii=False, indent=2)
+    return "\n".join(f"  {line}" for line in text.split("\n")).encode("utf-8")
+
+
+def replace_json_array_tail(file_path: str, old_last: Dict, new_items: List[Dict]) -> bool:
     """
-    保存数据到 JSON 文件
+    原地替换 JSON 数组文件的最后一个元素（可替换为多个，即追加），不重写整个文件
+
+    只用于 save_json 写出的数组文件：先确认文件以 old_last 结尾，再从该元素起覆盖写入。
+    与 atomic_write 不同，写入中途被终止会留下截断的数组，由 recover_data_files
+    从截断文件中抢救完整的前缀（至多丢失本次写入的记录）。
+
+    Args:
+        file_path: 数组文件路径
+        old_last: 文件中当前的最后一个元素
+        new_items: 替换后的元素（追加时为 [old_last, 新元素]）
+
+    Returns:
+        是否写入；文件不存在或结尾与 old_last 不符时返回 False，由调用方整体重写
+    """
+    tail = _format_element(old_last) + b"\n]"
+    content = b",\n".join(_format_element(item) for item in new_items) + b"\n]"
+    try:
+        with open(file_path, "r+b") as f:
+            start = f.seek(0, os.SEEK_END) - len(tail)
+            if start < 2:
+                return False
+            f.seek(start - 2)
+            if f.read() not in (b"[\n" + tail, b",\n" + tail):
+                return False
+
+            with span("storage.write", file=path.basename(file_path), bytes=len(content)):
+                f.seek(start)
+                f.write(content)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+    except FileNotFoundError:
+        return False
+
+    with _digest_lock:
+        _file_digests.pop(path.abspath(file_path), None)
+        if file_path not in _changed_files:
+            _changed_files.append(file_path)
+    _remember_valid(file_path)
+    return True
+
+
+def save_json(
+    data: Union[List, Dict], file_path: str, indent: int = 2, backup: bool = True
+) -> bool:
+    """
+    保存数据到 JSON 文件（原子写入）
 
     Args:
         data: 要保存的数据
         file_path: 文件路径
         indent: 缩进空格数
+        backup: 是否保留上一版本作为滚动备份
 
     Returns:
         是否成功
     """
     try:
-        dir_path = path.dirname(file_path)
-        if dir_path and not path.exists(dir_path):
-            makedirs(dir_path, exist_ok=True)
-
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=indent)
-
-        logger.info(f"数据已保存: {file_path}")
+        content = json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
+        if atomic_write(file_path, content, backup=backup):
+            logger.info(f"数据已保存: {file_path}")
+        else:
+            logger.info(f"数据未变化: {file_path}")
+        _remember_valid(file_path)
         return True
     except Exception as e:
         logger.error(f"保存数据失败: {e}")
         return False
 
 
+def iter_json_array(file_path: str, chunk_size: int = 65536) -> Iterator:
+    """
+    逐个解析 JSON 数组文件中的元素，按块读取，不构建完整列表
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        数组元素
+
+    Raises:
+        ValueError: 文件不是 JSON 数组，或内容损坏、被截断（已解析的元素仍会先产出）
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"不是 JSON 数组: {file_path}")
+        pos = 1
+        eof = False
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"JSON 数组未结束: {file_path}")
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                item, end = None, None
+            # 元素不完整（或恰好在块末尾结束，可能是被截断的数字）时读入下一块重试
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError(f"JSON 数组元素损坏: {file_path}")
+                chunk = f.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+
+            yield item
+            pos = end
+
+
+def salvage_json_array(file_path: str) -> List:
+    """
+    从截断的 JSON 数组文件中抢救完整的元素
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        可完整解析的前缀元素列表
+    """
+    items = []
+    try:
+        for item in iter_json_array(file_path):
+            items.append(item)
+    except (OSError, UnicodeDecodeError, ValueError):
+        pass
+    return items
+
+
+def recover_file(file_path: str) -> bool:
+    """
+    检测并修复损坏的 JSON 文件
+
+    优先选择记录更多的来源：截断文件中抢救出的前缀或滚动备份。
+    无法修复时将损坏文件改名保留，避免后续写入覆盖历史数据。
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        文件修复后（或本身）是否可用
+    """
+    if not path.exists(file_path) or _is_valid_json(file_path):
+        return True
+
+    logger.warning(f"检测到损坏的数据文件: {file_path}")
+
+    salvaged = salvage_json_array(file_path)
+    backup_path = get_backup_path(file_path)
+    backup_data = load_json(backup_path) if path.exists(backup_path) else None
+
+    if isinstance(backup_data, list) and len(backup_data) >= len(salvaged):
+        recovered = backup_data
+        source = "滚动备份"
+    elif salvaged:
+        recovered = salvaged
+        source = "截断文件"
+    elif backup_data is not None:
+        recovered = backup_data
+        source = "滚动备份"
+    else:
+        corrupt_path = f"{file_path}.corrupt-{get_cst_time('%Y%m%d%H%M%S')}"
+        os.replace(file_path, corrupt_path)
+        logger.error(f"无法修复，已保留损坏文件: {corrupt_path}")
+        return False
+
+    # 保留损坏版本的备份不可用，直接覆盖
+    if not save_json(recovered, file_path, backup=False):
+        return False
+    logger.info(f"已从{source}修复 {file_path}（{len(recovered)} 条）")
+    return True
+
+
+@locked
+def recover_data_files() -> List[str]:
+    """
+    启动时检查数据目录：清理残留临时文件，修复被截断的 JSON 文件
+
+    Returns:
+        被修复的文件列表
+    """
+    if not path.exists(DATA_DIR):
+        return []
+
+    for pattern in (".*.tmp", path.join("*", ".*.tmp")):
+        for tmp_path in glob(path.join(DATA_DIR, pattern)):
+            remove(tmp_path)
+            logger.info(f"已清理残留临时文件: {tmp_path}")
+
+    # 根目录文件 + 多房间布局下各房间目录中的文件
+    data_files = glob(path.join(DATA_DIR, "*.json")) + \
+        glob(path.join(DATA_DIR, "*", "*.json"))
+
+    repaired = []
+    for file_path in sorted(data_files):
+        # Token 文件不做备份与改名保留，损坏时由 TokenManager 回退到密码登录
+        if path.abspath(file_path) == path.abspath(TOKEN_FILE):
+            continue
+        if _is_valid_json(file_path):
+            continue
+        if recover_file(file_path):
+            repaired.append(file_path)
+
+    return repaired
+
+
+@locked
 def record_energy_data(data: Dict) -> Optional[List[Dict]]:
     """
     记录电量数据到当月文件
@@ -86,27 +549,306 @@ def record_energy_data(data: Dict) -> Optional[List[Dict]]:
     Returns:
         当月所有数据
     """
-    month_str = get_cst_time("%Y-%m")
+    month_str = month_key()
     file_path = path.join(DATA_DIR, f"{month_str}.json")
 
-    existing_data = load_json(file_path) or []
-    existing_data.append(data)
+    existing_data = load_month_for_append(file_path)
+    append_record(existing_data, data, month_str)
     save_json(existing_data, file_path)
 
     return existing_data
 
 
+def append_record(
+    records: List[Dict], record: Dict, month: str, heartbeat: int = RECORD_HEARTBEAT
+) -> bool:
+    """
+    追加一条记录，开启压缩时将与上一条相同的读数并入上一条
+
+    压缩后的记录形如 {"time": 开始时间, ..., "until": 最近一次相同读数的时间, "repeat": 合并次数}，
+    从开始时间起超过 heartbeat 分钟后重新追加完整记录。
+
+    Args:
+        records: 当月记录（原地修改）
+        record: 新记录
+        month: 所在月份 (YYYY-MM)
+        heartbeat: 心跳间隔（分钟），0 为不压缩
+
+    Returns:
+        是否并入了上一条记录
+    """
+    last = records[-1] if records else None
+    if heartbeat <= 0 or not last:
+        records.append(record)
+        return False
+
+    values = {k: v for k, v in record.items() if k != "time"}
+    last_values = {k: v for k, v in last.items() if k not in ("time", "until", "repeat")}
+    started = parse_record_time(last["time"], month)
+    current = parse_record_time(record["time"], month)
+    if values != last_values or not started or not current or \
+            (current - started).total_seconds() >= heartbeat * 60:
+        records.append(record)
+        return False
+
+    last["until"] = record["time"]
+    last["repeat"] = last.get("repeat", 0) + 1
+    return True
+
+
+def expand_records(records: List[Dict]) -> List[Dict]:
+    """
+    展开压缩记录：每个区间还原为开始与结束两个读数点，去掉 until / repeat 字段
+
+    Args:
+        records: 月份文件或最近记录文件中的记录
+
+    Returns:
+        普通记录列表
+    """
+    expanded = []
+    for record in records:
+        base = {k: v for k, v in record.items() if k not in ("until", "repeat")}
+        expanded.append(base)
+        if record.get("until"):
+            expanded.append({**base, "time": record["until"]})
+    return expanded
+
+
+def load_month_for_append(file_path: str) -> List[Dict]:
+    """
+    读取待追加的月份文件
+
+    文件存在但无法解析时先修复，绝不用单条记录覆盖整月历史。
+
+    Args:
+        file_path: 月份文件路径
+
+    Returns:
+        月份数据（文件不存在时为空列表）
+    """
+    if not path.exists(file_path):
+        return []
+
+    existing_data = load_json(file_path)
+    if existing_data is None:
+        recover_file(file_path)
+        if path.exists(file_path) and not _is_valid_json(file_path):
+            raise RuntimeError(f"月份文件损坏且无法修复: {file_path}")
+        existing_data = load_json(file_path) if path.exists(file_path) else None
+
+    return existing_data or []
+
+
+# ==================== 多房间布局 ====================
+#
+# data/
+# ├── rooms.json                    # 共享索引：房间 -> 月份列表、最新记录
+# └── <room>/
+#     ├── YYYY-MM.json              # [{"time": "...", "balance": ...}, ...]
+#     └── last_30_records.json      # 最近 N 条记录
+
+
+def get_room_dir(room: str) -> str:
+    """获取房间数据目录（房间号中的路径分隔符等字符替换为下划线）"""
+    return path.join(DATA_DIR, re.sub(r"[^\w.-]", "_", room).lstrip("."))
+
+
+def load_room_index() -> Dict:
+    """
+    加载多房间共享索引
+
+    Returns:
+        {"rooms": {room: {"months": [...], "latest": {...}}}, "updated_at": "..."}
+    """
+    index = load_json(ROOM_INDEX_FILE) if path.exists(ROOM_INDEX_FILE) else None
+    if not isinstance(index, dict):
+        index = {}
+    index.setdefault("rooms", {})
+    return index
+
+
+@locked
+def record_room_batch(records: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    批量记录一轮轮询中所有房间的数据
+
+    一次加锁写入全部房间：当月文件只原地改写末尾（追加新记录或更新被压缩的最后一条），
+    不读取、不重写整个文件；最近记录文件（最多 N 条）整体重写，共享索引在最后统一写入一次。
+    索引中保存每个房间当月文件的最后一条原始记录（tail），据此判断压缩与校验文件末尾；
+    tail 缺失或与文件不符（如被外部修改）时退回读取并重写整个当月文件。
+
+    Args:
+        records: 房间号 -> 记录 {"time": "...", "balance": ...}
+
+    Returns:
+        房间号 -> 当月最后一条记录
+    """
+    month_str = month_key()
+    index = load_room_index()
+    rooms = index["rooms"]
+    result = {}
+
+    for room, record in records.items():
+        room_dir = get_room_dir(room)
+        file_path = path.join(room_dir, f"{month_str}.json")
+        entry = rooms.setdefault(room, {})
+        months = entry.get("months") or []
+        last_path = path.join(room_dir, path.basename(LAST_RECORDS_FILE))
+
+        old_tail = entry.get("tail") if month_str in months else None
+        tail_records = [dict(old_tail)] if old_tail else []
+        merged = append_record(tail_records, dict(record), month_str)
+        appended = bool(old_tail) and replace_json_array_tail(
+            file_path, old_tail, tail_records if not merged else tail_records[-1:]
+        )
+
+        if not appended:
+            month_data = load_month_for_append(file_path)
+            old_tail = month_data[-1] if month_data else None
+            merged = append_record(month_data, dict(record), month_str)
+            save_json(month_data, file_path)
+            tail_records = month_data[-1:]
+
+        new_tail = tail_records[-1]
+        result[room] = new_tail
+        if month_str not in months:
+            months = sorted(months + [month_str], reverse=True)
+        entry["months"] = months
+        entry["tail"] = new_tail
+        entry["latest"] = expand_records([new_tail])[-1]
+
+        # 最近 N 条（压缩记录展开为读数点，与默认布局一致）：在现有文件末尾增量更新，
+        # 文件缺失或末尾与当月文件不符时按月份重新构建
+        last_records = load_json(last_path) if appended and path.exists(last_path) else None
+        old_points = expand_records([old_tail]) if old_tail else []
+        count = min(len(last_records or []), len(old_points))
+        if last_records and count and last_records[-count:] == old_points[-count:]:
+            if merged:
+                last_records = last_records[:-count]
+            last_records = (last_records + expand_records([new_tail]))[-LAST_RECORDS_COUNT:]
+        else:
+            last_records = build_room_last_records(room, months, None if appended else month_data)
+        save_json(last_records, last_path)
+
+    index["updated_at"] = get_cst_time()
+    save_json(index, ROOM_INDEX_FILE)
+    logger.info(f"已批量写入 {len(records)} 个房间的数据")
+
+    return result
+
+
+def build_room_last_records(
+    room: str, months: List[str], current: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """
+    从月份文件构建房间的最近 N 条读数点（当月不足时从之前的月份补充）
+
+    Args:
+        room: 房间号
+        months: 房间的月份列表（倒序，第一个为当月）
+        current: 已读入的当月记录，为空时从文件读取
+
+    Returns:
+        展开后的最近读数点（按时间正序）
+    """
+    room_dir = get_room_dir(room)
+    last_records: List[Dict] = []
+    for i, month in enumerate(months):
+        need_count = LAST_RECORDS_COUNT - len(last_records)
+        if need_count <= 0:
+            break
+        if i == 0 and current is not None:
+            data = current
+        else:
+            month_path = path.join(room_dir, f"{month}.json")
+            data = (load_json(month_path) if path.exists(month_path) else None) or []
+        last_records = expand_records(data[-need_count:])[-need_count:] + last_records
+    return last_records
+
+
+def get_month_file_hash(file_path: str) -> str:
+    """
+    计算月份文件的内容哈希
+
+    Args:
+        file_path: 月份文件路径
+
+    Returns:
+        截断后的 SHA-256 十六进制摘要
+    """
+    return file_digest(file_path)[:MONTH_HASH_LENGTH]
+
+
+def load_month_files() -> Dict[str, str]:
+    """
+    读取 time.json 中已记录的月份 -> 发布文件名映射
+
+    Returns:
+        映射字典，旧版列表格式返回空字典
+    """
+    time_data = load_json(TIME_FILE)
+    if isinstance(time_data, dict):
+        return dict(time_data.get("files") or {})
+    return {}
+
+
+def freeze_month(month: str, known_files: Dict[str, str]) -> str:
+    """
+    冻结已结束的月份：生成内容哈希命名的只读副本
+
+    已冻结且副本存在、大小与原文件相同的月份直接复用，不再重复读取原文件；
+    原文件在冻结后被改动（迟到的写入、从备份修复、手工修正）时大小会变化，重新计算哈希生成新副本。
+
+    Args:
+        month: 月份 (YYYY-MM)
+        known_files: 已记录的映射
+
+    Returns:
+        发布使用的文件名
+    """
+    source = path.join(DATA_DIR, f"{month}.json")
+    frozen_name = known_files.get(month)
+    if frozen_name and frozen_name != f"{month}.json":
+        frozen_path = path.join(DATA_DIR, frozen_name)
+        if path.exists(frozen_path) and path.getsize(frozen_path) == path.getsize(source):
+            return frozen_name
+        logger.info(f"已冻结的月份发生变化，重新冻结: {month}")
+
+    frozen_name = f"{month}.{get_month_file_hash(source)}.json"
+    target = path.join(DATA_DIR, frozen_name)
+    if not path.exists(target):
+        with open(source, "rb") as f:
+            atomic_write(target, f.read(), backup=False)
+        logger.info(f"月份已冻结: {month} -> {frozen_name}")
+
+    # 清理同月份的旧哈希副本
+    for stale in glob(path.join(DATA_DIR, f"{month}.*.json")):
+        if path.basename(stale) != frozen_name:
+            remove(stale)
+
+    return frozen_name
+
+
+@locked
 def update_time_list() -> List[str]:
     """
     更新时间列表文件
 
+    time.json 格式:
+        {"months": ["2025-02", "2025-01"],
+         "files": {"2025-02": "2025-02.json", "2025-01": "2025-01.3f2a9c1b.json"}}
+
+    当前月份使用原文件名（需重新验证），已结束的月份使用内容哈希文件名，
+    浏览器和 CDN 可以永久缓存。
+
     Returns:
         时间列表（按时间倒序）
     """
     if not path.exists(DATA_DIR):
         raise FileNotFoundError(f"数据目录不存在: {DATA_DIR}")
 
-    # 查找所有月份文件
+    # 查找所有月份文件（不含哈希副本）
     pattern = path.join(DATA_DIR, "????-??.json")
     json_files = [
         path.splitext(path.basename(f))[0]
@@ -116,44 +858,198 @@ def update_time_list() -> List[str]:
     # 按时间倒序排列
     json_files = sorted(
         json_files,
-        key=lambda x: datetime.strptime(x, "%Y-%m"),
+        key=parse_month,
         reverse=True
     )
 
-    save_json(json_files, TIME_FILE)
+    current_month = month_key()
+    known_files = load_month_files()
+    month_files = {}
+    for month in json_files:
+        if month < current_month:
+            month_files[month] = freeze_month(month, known_files)
+        else:
+            month_files[month] = f"{month}.json"
+
+    save_json({"months": json_files, "files": month_files}, TIME_FILE)
     logger.info("时间列表已更新")
 
     return json_files
 
 
-def update_last_records(current_month_data: Optional[List[Dict]] = None) -> None:
+@locked
+def update_last_records() -> None:
+    """更新最近 N 条记录文件（从最新月份反向读取，跨月自动补足）"""
+    update_time_list()
+
+    last_records = [record for _, record in islice(iter_records(reverse=True), LAST_RECORDS_COUNT)]
+    last_records.reverse()
+    save_json(last_records, LAST_RECORDS_FILE)
+
+    logger.info(f"最近 {LAST_RECORDS_COUNT} 条记录已更新")
+
+
+def list_month_files(room: Optional[str] = None) -> Dict[str, str]:
+    """
+    列出某个序列的全部月份文件
+
+    Args:
+        room: 房间号（多房间布局），为空时为默认布局
+
+    Returns:
+        {月份: 文件路径}
     """
-    更新最近 30 条记录文件
+    if room:
+        room_dir = get_room_dir(room)
+        months = load_room_index()["rooms"].get(room, {}).get("months") or []
+        return {month: path.join(room_dir, f"{month}.json") for month in months}
+
+    # 优先使用 time.json 中的月份清单，缺失时扫描目录
+    time_data = load_json(TIME_FILE) if path.exists(TIME_FILE) else None
+    if isinstance(time_data, dict):
+        months = time_data.get("months") or []
+    elif isinstance(time_data, list):
+        months = time_data
+    else:
+        months = [
+            path.splitext(path.basename(f))[0]
+            for f in glob(path.join(DATA_DIR, "????-??.json"))
+        ]
+    return {month: path.join(DATA_DIR, f"{month}.json") for month in months}
+
+
+def iter_records(
+    room: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    reverse: bool = False,
+) -> Iterator[Tuple[datetime, Dict]]:
+    """
+    按时间顺序跨月份流式读取历史记录
+
+    正序时逐条解析文件，内存占用与历史长度无关；倒序时每次只加载一个月份。
+    压缩记录（until / repeat）会展开为开始、结束两个读数点。
 
     Args:
-        current_month_data: 当月数据（可选）
+        room: 房间号（多房间布局），为空时为默认布局
+        start: 起始时间（含，带时区）
+        end: 结束时间（含，带时区）
+        reverse: 是否从最新记录开始倒序读取（用于"最近 N 条"）
+
+    Yields:
+        (记录时间, 记录)
     """
-    time_list = update_time_list()
+    months = list_month_files(room)
+    first_month = month_key(start) if start else None
+    last_month = month_key(end) if end else None
 
-    # 获取当月数据
-    if current_month_data is None and time_list:
-        current_month_file = path.join(DATA_DIR, f"{time_list[0]}.json")
-        current_month_data = load_json(current_month_file) or []
+    for month in sorted(months, reverse=reverse):
+        if (first_month and month < first_month) or (last_month and month > last_month):
+            continue
+        file_path = months[month]
+        if not path.exists(file_path):
+            continue
 
-    current_count = len(current_month_data) if current_month_data else 0
+        try:
+            if reverse:
+                records = reversed(expand_records(list(iter_json_array(file_path))))
+            else:
+                records = (
+                    point
+                    for record in iter_json_array(file_path)
+                    for point in expand_records([record])
+                )
+            for record in records:
+                recorded_at = parse_record_time(record.get("time", ""), month)
+                if recorded_at is None:
+                    continue
+                if (start and recorded_at < start) or (end and recorded_at > end):
+                    continue
+                yield recorded_at, record
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取月份文件失败 {file_path}: {e}")
 
-    # 如果当月数据不足 30 条，从上月补充
-    if current_count < 30 and len(time_list) > 1:
-        prev_month_file = path.join(DATA_DIR, f"{time_list[1]}.json")
-        prev_month_data = load_json(prev_month_file) or []
 
-        need_count = min(30 - current_count, len(prev_month_data))
-        combined_data = prev_month_data[-need_count:] + (current_month_data or [])
-    else:
-        combined_data = current_month_data or []
+def get_latest_record(room: Optional[str] = None) -> Optional[Dict]:
+    """
+    获取最新一条记录
+
+    Args:
+        room: 房间号（多房间布局），为空时读取默认布局的最近记录文件
+
+    Returns:
+        最新记录，无数据时返回 None
+    """
+    if room:
+        return load_room_index()["rooms"].get(room, {}).get("latest")
+
+    records = load_json(LAST_RECORDS_FILE) if path.exists(LAST_RECORDS_FILE) else None
+    return expand_records(records[-1:])[-1] if records else None
+
+
+def load_latest() -> Dict:
+    """
+    读取最新读数文件
+
+    Returns:
+        {"updated_at": "...", "rooms": {key: {...}}}，不存在时返回空结构
+    """
+    latest = load_json(LATEST_FILE) if path.exists(LATEST_FILE) else None
+    if not isinstance(latest, dict):
+        latest = {}
+    latest.setdefault("rooms", {})
+    return latest
+
+
+@locked
+def update_latest(time_str: str, readings: Dict[str, float]) -> Dict:
+    """
+    更新最新读数文件 latest.json（只含每个房间的当前状态，不含历史）
+
+    每个房间记录:
+        time: 最近一次读数时间
+        balance: 当前余额
+        previous: 上一次变化前的余额（用于趋势箭头）
+        changed_at: 余额最近一次变化的时间
+        rate: 平滑后的消耗速率（度/小时），仅在余额下降时更新，充值不计入
+
+    Args:
+        time_str: 读数时间 ("MM-DD HH:MM:SS")
+        readings: 房间键 -> 余额（默认模式为 "light" / "ac"，整栋楼模式为房间号）
+
+    Returns:
+        更新后的内容
+    """
+    latest = load_latest()
+    rooms = latest["rooms"]
+
+    for key, balance in readings.items():
+        entry = rooms.get(key)
+        if not entry:
+            rooms[key] = {
+                "time": time_str, "balance": balance, "previous": None,
+                "changed_at": time_str, "rate": None,
+            }
+            continue
+
+        entry["time"] = time_str
+        if balance == entry["balance"]:
+            continue
+
+        if balance < entry["balance"]:
+            changed_at = parse_record_time(entry["changed_at"])
+            now = parse_record_time(time_str)
+            hours = (now - changed_at).total_seconds() / 3600 if changed_at and now else 0
+            if hours > 0:
+                rate = (entry["balance"] - balance) / hours
+                if entry.get("rate") is not None:
+                    rate = RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * entry["rate"]
+                entry["rate"] = round(rate, 4)
 
-    # 只保留最近 30 条
-    last_30 = combined_data[-30:]
-    save_json(last_30, LAST_RECORDS_FILE)
+        entry["previous"] = entry["balance"]
+        entry["balance"] = balance
+        entry["changed_at"] = time_str
 
-    logger.info("最近 30 条记录已更新")
+    latest["updated_at"] = get_cst_time()
+    save_json(latest, LATEST_FILE)
+    return latest
@@ -0,0 +1,106 @@
+"""
+时间工具模块
+
+统一提供时区、当前时间、记录时间戳与月份键，时区对象只构建一次。
+所有写入数据文件、Token 文件的时间都应通过本模块生成。
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config import TIMEZONE
+
+# 记录中的时间格式（不含年份，年份由所在月份文件决定）
+RECORD_TIME_FORMAT = "%m-%d %H:%M:%S"
+# 月份文件名格式
+MONTH_FORMAT = "%Y-%m"
+# 完整时间格式（Token 保存时间、索引更新时间等）
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@lru_cache(maxsize=None)
+def get_timezone() -> ZoneInfo:
+    """获取配置的时区对象（只构建一次）"""
+    return ZoneInfo(TIMEZONE)
+
+
+def now() -> datetime:
+    """获取当前时间（带时区）"""
+    return datetime.now(get_timezone())
+
+
+def get_cst_time(fmt: str = DATETIME_FORMAT) -> str:
+    """
+    获取中国标准时间字符串
+
+    Args:
+        fmt: 时间格式
+
+    Returns:
+        格式化的时间字符串
+    """
+    return now().strftime(fmt)
+
+
+def record_timestamp(moment: Optional[datetime] = None) -> str:
+    """
+    生成记录时间戳（"MM-DD HH:MM:SS"）
+
+    Args:
+        moment: 指定时间，默认当前时间
+
+    Returns:
+        记录时间字符串
+    """
+    return (moment or now()).strftime(RECORD_TIME_FORMAT)
+
+
+def month_key(moment: Optional[datetime] = None) -> str:
+    """
+    生成月份键（"YYYY-MM"），即月份数据文件名
+
+    Args:
+        moment: 指定时间，默认当前时间
+
+    Returns:
+        月份字符串
+    """
+    return (moment or now()).strftime(MONTH_FORMAT)
+
+
+def parse_month(month: str) -> datetime:
+    """解析月份键为该月第一天（不带时区，仅用于排序与比较）"""
+    return datetime.strptime(month, MONTH_FORMAT)
+
+
+def parse_record_time(time_str: str, month: Optional[str] = None) -> Optional[datetime]:
+    """
+    解析记录中的时间（"MM-DD HH:MM:SS" 或 "MM-DD HH:MM"）
+
+    记录本身不含年份：优先使用所在月份文件的年份，
+    否则按当前时间推断（月份大于当前月份视为去年）。
+
+    Args:
+        time_str: 记录时间
+        month: 所在月份文件 (YYYY-MM，可选)
+
+    Returns:
+        带时区的时间，无法解析时返回 None
+    """
+    tz = get_timezone()
+    try:
+        if month:
+            year = int(month[:4])
+        else:
+            current = now()
+            year = current.year if int(time_str.split("-")[0]) <= current.month else current.year - 1
+    except ValueError:
+        return None
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(f"{year}-{time_str}", fmt).replace(tzinfo=tz)
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,278 @@
+"""
+运行耗时统计模块
+
+记录各阶段耗时（span）和重试等待，运行结束时输出 JSON 格式的运行报告。
+RunBudget 为一次运行设置截止时间和共享的重试等待预算，获取电量与发送通知的重试都从中扣除。
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from config import DEADLINE_RESERVE, RETRY_BUDGET, RUN_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+
+class RunReport:
+    """单次运行的耗时报告"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.spans: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """注册阶段结束回调（如将耗时同步到 Prometheus 直方图）"""
+        self._listeners.append(callback)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(entry)
+        for callback in self._listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                logger.debug(f"耗时回调失败: {e}")
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        记录一个阶段的耗时，支持嵌套
+
+        Args:
+            name: 阶段名称，如 "cas.login"
+            **attrs: 附加属性，如 room="xxx"
+        """
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            entry = {
+                "name": name,
+                "parent": parent,
+                "start": round(start - self._origin, 4),
+                "duration": round(duration, 4),
+                "status": status,
+                "thread": threading.current_thread().name,
+            }
+            if attrs:
+                entry["attrs"] = attrs
+            self._append(entry)
+
+    def add_wait(self, name: str, seconds: float, **attrs) -> None:
+        """记录一次重试等待（sleep 之前调用）"""
+        stack = self._stack()
+        entry = {
+            "name": name,
+            "parent": stack[-1] if stack else None,
+            "start": round(time.perf_counter() - self._origin, 4),
+            "duration": round(seconds, 4),
+            "status": "wait",
+            "thread": threading.current_thread().name,
+        }
+        if attrs:
+            entry["attrs"] = attrs
+        self._append(entry)
+
+    def reset(self) -> None:
+        """清空已记录的阶段（常驻模式下每轮轮询后调用）"""
+        with self._lock:
+            self.spans = []
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按阶段名称汇总：次数、总耗时、最大耗时、失败次数"""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for entry in spans:
+            item = totals.setdefault(
+                entry["name"], {"count": 0, "total": 0.0, "max": 0.0, "errors": 0}
+            )
+            item["count"] += 1
+            item["total"] = round(item["total"] + entry["duration"], 4)
+            item["max"] = max(item["max"], entry["duration"])
+            if entry["status"] == "error":
+                item["errors"] += 1
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        """生成运行报告"""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "started_at": self.started_at,
+            "duration": round(time.perf_counter() - self._origin, 4),
+            "summary": self.summary(),
+            "budget": budget.to_dict(),
+            "spans": spans,
+        }
+
+    def emit(self, file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        输出运行报告：日志中打印汇总，并可写入 JSON 文件
+
+        Args:
+            file_path: 报告文件路径（可选）
+
+        Returns:
+            运行报告
+        """
+        data = self.to_dict()
+        logger.info(f"运行报告: {json.dumps(data['summary'], ensure_ascii=False)}")
+        if data["budget"]["skipped"]:
+            logger.warning(f"因时间预算跳过: {', '.join(data['budget']['skipped'])}")
+
+        if file_path:
+            try:
+                with open(file_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                logger.info(f"运行报告已保存: {file_path}")
+            except OSError as e:
+                logger.error(f"保存运行报告失败: {e}")
+
+        return data
+
+
+class RunBudget:
+    """
+    单次运行的截止时间与共享重试预算
+
+    - deadline: 运行开始后的最长秒数，0 为不限
+    - retry_budget: 所有重试等待（sleep）合计的最长秒数，0 为不限
+    - reserve: 距截止时间不足该秒数时，按优先级从低到高逐步放弃通知渠道
+    """
+
+    def __init__(
+        self, deadline: float = RUN_DEADLINE, retry_budget: float = RETRY_BUDGET,
+        reserve: float = DEADLINE_RESERVE,
+    ):
+        self.deadline = deadline
+        self.retry_budget = retry_budget
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """重新开始计时（常驻模式下每轮轮询开始时调用）"""
+        with self._lock:
+            self._started = time.monotonic()
+            self.retry_spent = 0.0
+            self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        """距截止时间的秒数，未设置截止时间时为无穷大"""
+        if not self.deadline:
+            return float("inf")
+        return self.deadline - (time.monotonic() - self._started)
+
+    def allow_wait(self, seconds: float) -> bool:
+        """
+        申请一次重试等待，允许时从预算中扣除
+
+        Args:
+            seconds: 等待秒数
+
+        Returns:
+            等待后仍在截止时间内且重试预算足够时返回 True
+        """
+        with self._lock:
+            if seconds >= self.remaining():
+                return False
+            if self.retry_budget and self.retry_spent + seconds > self.retry_budget:
+                return False
+            self.retry_spent += seconds
+            return True
+
+    def admits(self, rank: float) -> bool:
+        """
+        按优先级判断是否还有时间执行
+
+        Args:
+            rank: 优先级位置，0 为最高，1 为最低
+
+        Returns:
+            未过截止时间，且剩余时间充足或该优先级仍在保留范围内
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            return False
+        return remaining >= self.reserve or rank <= remaining / self.reserve
+
+    def skip(self, name: str) -> None:
+        """记录因时间预算跳过的操作"""
+        with self._lock:
+            self.skipped.append(name)
+        logger.warning(f"剩余时间不足，跳过: {name}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deadline": self.deadline,
+                "retry_budget": self.retry_budget,
+                "retry_spent": round(self.retry_spent, 4),
+                "skipped": list(self.skipped),
+            }
+
+
+def stop_on_budget(retry_state) -> bool:
+    """tenacity 停止条件：下一次重试等待超出截止时间或共享重试预算时停止"""
+    seconds = getattr(retry_state, "upcoming_sleep", 0.0) or 0.0
+    if budget.allow_wait(seconds):
+        return False
+    fn = getattr(retry_state, "fn", None)
+    logger.warning(f"重试预算不足，停止重试: {getattr(fn, '__name__', 'unknown')}")
+    return True
+
+
+# 全局运行预算
+budget = RunBudget()
+
+# 全局运行报告
+report = RunReport()
+span = report.span
+
+
+def timed(name: str):
+    """将函数调用记录为一个阶段的装饰器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_retry_wait(retry_state) -> None:
+    """tenacity before_sleep 回调：记录重试等待时长"""
+    fn = getattr(retry_state, "fn", None)
+    name = getattr(fn, "__name__", "unknown")
+    seconds = retry_state.next_action.sleep if retry_state.next_action else 0.0
+    report.add_wait(
+        f"retry_wait.{name.lstrip('_')}",
+        seconds,
+        attempt=retry_state.attempt_number,
+    )